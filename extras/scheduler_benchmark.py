@@ -0,0 +1,97 @@
+"""Compare the event lists in `utilities.schedulers`.
+
+The "hold" benchmark keeps a fixed number of entries pending and times
+removing the next one and adding a replacement a little later, which is
+what a simulation's event list does in steady state. The "scenario"
+benchmark times `cost_of_sharing` with a large team under each scheduler
+and checks that the results are the same.
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+import polars as pl
+
+# Import the repository's utilities and a scenario to time.
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "scenarios"))
+sys.path.insert(0, str(ROOT))
+import cost_of_sharing  # noqa: E402
+
+from utilities import SCHEDULERS, Streams  # noqa: E402
+
+
+def hold(name, n_pending, n_ops, seed):
+    """Seconds per hold operation with `n_pending` entries in the list."""
+    rng = random.Random(seed)
+    queue = SCHEDULERS[name]()
+    # Delays average `n_pending`, so about one entry falls due per unit time.
+    for i in range(n_pending):
+        queue.push((rng.expovariate(1.0 / n_pending), 1, i, None))
+    increments = [rng.expovariate(1.0 / n_pending) for _ in range(n_ops)]
+    start = time.perf_counter()
+    for i, increment in enumerate(increments, n_pending):
+        entry = queue.pop()
+        queue.push((entry[0] + increment, 1, i, None))
+    return (time.perf_counter() - start) / n_ops
+
+
+def scenario(name, overrides):
+    """Seconds to simulate `cost_of_sharing` and its jobs table."""
+    sim = cost_of_sharing.Simulation()
+    for key, value in overrides.items():
+        setattr(sim.params, key, value)
+    sim.rng = Streams(sim.params.n_seed)
+    sim.use_scheduler(name)
+    start = time.perf_counter()
+    sim.simulate()
+    return time.perf_counter() - start, sim.result()["jobs"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n-coder", type=int, default=200, help="team size")
+    parser.add_argument("--ops", type=int, default=200_000, help="hold operations")
+    parser.add_argument("--seed", type=int, default=97531, help="RNG seed")
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[10, 100, 1_000, 10_000, 100_000],
+        help="numbers of pending entries for the hold benchmark",
+    )
+    parser.add_argument("--t-sim", type=float, default=500, help="simulation length")
+    args = parser.parse_args()
+
+    rows = [
+        {
+            "scheduler": name,
+            "n_pending": n,
+            "usec_per_op": 1e6 * hold(name, n, args.ops, args.seed),
+        }
+        for n in args.sizes
+        for name in sorted(SCHEDULERS)
+    ]
+    print("## hold\n")
+    print(pl.DataFrame(rows))
+
+    # Keep the team about 80% busy whatever its size.
+    overrides = {
+        "n_coder": args.n_coder,
+        "t_job_interval": 2.5 / args.n_coder,
+        "t_sim": args.t_sim,
+    }
+    rows, jobs = [], {}
+    for name in sorted(SCHEDULERS):
+        seconds, jobs[name] = scenario(name, overrides)
+        rows.append({"scheduler": name, "seconds": seconds})
+    same = all(table == jobs["heap"] for table in jobs.values())
+    print(f"\n## cost_of_sharing with {args.n_coder} coders (same results: {same})\n")
+    print(pl.DataFrame(rows))
+
+
+if __name__ == "__main__":
+    main()
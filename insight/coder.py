@@ -1,11 +1,12 @@
-from simpy import Interrupt, PriorityStore
+from simpy import Interrupt
 
 from actor import Actor
+import util
 
 
 class Coder(Actor):
     def post_init(self):
-        self.queue = PriorityStore(self.sim)
+        self.queue = util.SourcePriorityStore(self.sim)
         self.stack = []
 
     def run(self):
@@ -44,13 +45,9 @@ class Coder(Actor):
                 self.stack.append(job)
 
     def get(self):
-        new_req = self.sim.code_queue.get()
-        own_req = self.queue.get()
-        result = yield (new_req | own_req)
-        if (len(result.events) == 2) or (own_req in result):
-            new_req.cancel()
-            job = result[own_req]
-        else:
-            own_req.cancel()
-            job = result[new_req]
-        return job
+        req = util.get_any(self.queue, self.sim.code_queue)
+        try:
+            return (yield req)
+        except Interrupt:
+            req.cancel()
+            raise
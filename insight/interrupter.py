@@ -1,5 +1,3 @@
-from random import choice, expovariate
-
 from actor import Actor
 from jobs import JobInterrupt
 
@@ -8,8 +6,10 @@ class Interrupter(Actor):
     def run(self):
         while True:
             yield self.sim.timeout(self.rand_t_arrival())
-            coder = choice(self.sim.coders)
+            coder = self.sim.rng["interrupt_target"].choice(self.sim.coders)
             coder.proc.interrupt(JobInterrupt(self.sim))
 
     def rand_t_arrival(self):
-        return expovariate(1.0 / self.sim.params.t_interrupt_interval)
+        return self.sim.rng["interrupt_arrival"].expovariate(
+            1.0 / self.sim.params.t_interrupt_interval
+        )
@@ -1,5 +1,4 @@
 from dataclasses import dataclass
-from random import lognormvariate, uniform
 
 from recorder import Recorder
 from util import Priority
@@ -35,11 +34,6 @@ class Job(Recorder):
     def start(self):
         self.t_start = self.sim.now
 
-    def __lt__(self, other):
-        if self.priority == other.priority:
-            return self.t_create < other.t_create
-        return self.priority < other.priority
-
 
 class JobIntegration(Job):
     def __init__(self, sim):
@@ -54,7 +48,7 @@ class JobInterrupt(Job):
         super().__init__(sim, "interrupt", Priority.HIGH)
 
     def rand_t_code(self):
-        return lognormvariate(
+        return self.sim.rng["interrupt_duration"].lognormvariate(
             self.sim.params.t_interrupt_mean, self.sim.params.t_interrupt_std
         )
 
@@ -64,4 +58,6 @@ class JobRegular(Job):
         super().__init__(sim, "regular", Priority.LOW)
 
     def rand_t_code(self):
-        return lognormvariate(self.sim.params.t_code_mean, self.sim.params.t_code_std)
+        return self.sim.rng["job_duration"].lognormvariate(
+            self.sim.params.t_code_mean, self.sim.params.t_code_std
+        )
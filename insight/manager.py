@@ -1,5 +1,3 @@
-from random import expovariate
-
 from actor import Actor
 from jobs import JobRegular
 
@@ -12,4 +10,6 @@ class Manager(Actor):
             yield self.sim.timeout(self.rand_t_arrival())
 
     def rand_t_arrival(self):
-        return expovariate(1.0 / self.sim.params.t_code_interval)
+        return self.sim.rng["job_arrival"].expovariate(
+            1.0 / self.sim.params.t_code_interval
+        )
@@ -1,20 +1,6 @@
-from collections import defaultdict
-from itertools import count
-
-
 class Recorder:
-    _next_id = defaultdict(count)
-    _all = defaultdict(list)
-
-    @staticmethod
-    def reset():
-        Recorder._next_id = defaultdict(count)
-        Recorder._all = defaultdict(list)
-
     def __init__(self, sim):
-        cls = self.__class__
-        self.id = next(self._next_id[cls])
-        self._all[cls].append(self)
+        self.id = sim.registry.add(self)
         self.sim = sim
 
     def __str__(self):
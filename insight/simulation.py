@@ -1,7 +1,6 @@
 """Base simulator with all the features."""
 
 import json
-from simpy import Environment, Store
 import sys
 import util
 
@@ -10,15 +9,15 @@ from interrupter import Interrupter
 from log import Log
 from jobs import JobIntegration, JobInterrupt, JobRegular
 from manager import Manager
-from monitor import QueueMonitor
 from params import Params
-from recorder import Recorder
 
 
-class Simulation(Environment):
+class Simulation(util.LeanEnvironment):
     def __init__(self):
         super().__init__()
         self.params = Params()
+        self.rng = util.Streams(self.params.n_seed)
+        self.registry = None
         self.code_queue = None
         self.log = Log(env=self)
         self.coders = []
@@ -27,23 +26,25 @@ class Simulation(Environment):
         return self.timeout(0)
 
     def simulate(self):
-        Recorder.reset()
-        self.code_queue = Store(self)
+        self.registry = util.Registry()
+        self.code_queue = util.TallyStore(self)
         Manager(self)
         Interrupter(self)
-        QueueMonitor(self)
         self.coders = [Coder(self) for _ in range(self.params.n_coders)]
         self.run(until=self.params.t_sim)
 
     def result(self):
+        lengths, _ = util.downsample(
+            self.code_queue, self.params.t_queue_monitor, self.now, name="code"
+        )
         return {
             "jobs": [
-                *[job.json() for job in Recorder._all[JobIntegration]],
-                *[job.json() for job in Recorder._all[JobInterrupt]],
-                *[job.json() for job in Recorder._all[JobRegular]],
+                *[job.json() for job in self.registry[JobIntegration]],
+                *[job.json() for job in self.registry[JobInterrupt]],
+                *[job.json() for job in self.registry[JobRegular]],
             ],
             "actors": self.log.actor_events,
-            "queues": self.log.queue_events,
+            "queues": lengths,
         }
 
 
@@ -53,4 +54,4 @@ if __name__ == "__main__":
         json.dump(results, sys.stdout, indent=2)
     if args.tables:
         frames = util.as_frames(results)
-        util.show_frames(frames, list(results[0]["params"].keys()))
+        util.show_frames(frames, list(Params.__dataclass_fields__))
@@ -1,12 +1,8 @@
 """Multiple workers decomposing jobs."""
 
-from collections import defaultdict
 from dataclasses import dataclass
 from dataclasses_json import dataclass_json
-from itertools import count
 import json
-import random
-from simpy import Environment, Store, PriorityStore
 import sys
 import util
 
@@ -33,21 +29,21 @@ class Params:
     t_sim: float = 200
 
 
-class Simulation(Environment):
+class Simulation(util.LeanEnvironment):
     def __init__(self):
         super().__init__()
         self.params = Params()
+        self.rng = util.Streams(self.params.n_seed)
+        self.registry = None
         self.code_queue = None
         self.coders = []
-        self.lengths = []
-        self.ages = []
 
     def do_nothing(self):
         return self.timeout(0)
 
     def simulate(self):
-        Recorder.reset()
-        self.code_queue = Store(self)
+        self.registry = util.Registry()
+        self.code_queue = util.TallyStore(self)
         self.process(Manager(self).run())
         self.coders = []
         for _ in range(self.params.n_coder):
@@ -55,49 +51,46 @@ class Simulation(Environment):
             self.coders.append(coder)
             coder.proc = self.process(coder.run())
         self.process(Interrupter(self).run())
-        self.process(Monitor(self).run())
         self.run(until=self.params.t_sim)
 
     def result(self):
+        lengths, ages = util.downsample(
+            self.code_queue, self.params.t_monitor, self.now
+        )
         return {
             "jobs": [
-                *[job.json() for job in Recorder._all[JobFragment]],
-                *[job.json() for job in Recorder._all[JobInterrupt]],
-                *[job.json() for job in Recorder._all[JobRegular]],
+                *[job.json() for job in self.registry[JobFragment]],
+                *[job.json() for job in self.registry[JobInterrupt]],
+                *[job.json() for job in self.registry[JobRegular]],
             ],
-            "lengths": self.lengths,
-            "ages": self.ages,
-            "coders": [coder.json() for coder in Recorder._all[Coder]],
+            "lengths": lengths,
+            "ages": ages,
+            "queues": [util.queue_stats(self.code_queue, self.now)],
+            "coders": [coder.json() for coder in self.registry[Coder]],
         }
 
     def rand_interrupt_arrival(self):
-        return random.expovariate(1.0 / self.params.t_interrupt_interval)
+        return self.rng["interrupt_arrival"].expovariate(
+            1.0 / self.params.t_interrupt_interval
+        )
 
     def rand_interrupt_duration(self):
-        return random.lognormvariate(
+        return self.rng["interrupt_duration"].lognormvariate(
             self.params.t_interrupt_mean, self.params.t_interrupt_std
         )
 
     def rand_job_arrival(self):
-        return random.expovariate(1.0 / self.params.t_job_interval)
+        return self.rng["job_arrival"].expovariate(1.0 / self.params.t_job_interval)
 
     def rand_job_duration(self):
-        return random.lognormvariate(self.params.t_job_mean, self.params.t_job_std)
+        return self.rng["job_duration"].lognormvariate(
+            self.params.t_job_mean, self.params.t_job_std
+        )
 
 
 class Recorder:
-    _next_id = defaultdict(count)
-    _all = defaultdict(list)
-
-    @staticmethod
-    def reset():
-        Recorder._next_id = defaultdict(count)
-        Recorder._all = defaultdict(list)
-
     def __init__(self, sim):
-        cls = self.__class__
-        self.id = next(self._next_id[cls])
-        self._all[cls].append(self)
+        self.id = sim.registry.add(self)
         self.sim = sim
 
     def json(self):
@@ -127,11 +120,6 @@ class Job(Recorder):
     def needs_decomp(self):
         return False
 
-    def __lt__(self, other):
-        if self.priority == other.priority:
-            return self.t_create < other.t_create
-        return self.priority < other.priority
-
 
 class JobFragment(Job):
     def __init__(self, coder, placeholder, duration):
@@ -186,7 +174,7 @@ class Interrupter(Recorder):
     def run(self):
         while True:
             yield self.sim.timeout(self.sim.rand_interrupt_arrival())
-            coder = random.choice(self.sim.coders)
+            coder = self.sim.rng["interrupt_target"].choice(self.sim.coders)
             yield coder.queue.put(JobInterrupt(self.sim))
 
 
@@ -195,7 +183,7 @@ class Coder(Recorder):
 
     def __init__(self, sim):
         super().__init__(sim)
-        self.queue = PriorityStore(self.sim)
+        self.queue = util.SourcePriorityStore(self.sim)
         self.t_work = 0
 
     def run(self):
@@ -218,31 +206,7 @@ class Coder(Recorder):
             yield self.queue.put(JobFragment(self, placeholder, d))
 
     def get(self):
-        new_req = self.sim.code_queue.get()
-        own_req = self.queue.get()
-        result = yield (new_req | own_req)
-        if (len(result.events) == 2) or (own_req in result):
-            new_req.cancel()
-            job = result[own_req]
-        else:
-            own_req.cancel()
-            job = result[new_req]
-        return job
-
-
-class Monitor(Recorder):
-    def run(self):
-        while True:
-            now = self.sim.now
-            length = len(self.sim.code_queue.items)
-            self.sim.lengths.append({"time": now, "length": length})
-            mean_age = (
-                0
-                if length == 0
-                else sum((now - j.t_create) for j in self.sim.code_queue.items) / length
-            )
-            self.sim.ages.append({"time": now, "mean_age": mean_age})
-            yield self.sim.timeout(self.sim.params.t_monitor)
+        return (yield util.get_any(self.queue, self.sim.code_queue))
 
 
 if __name__ == "__main__":
@@ -251,4 +215,4 @@ if __name__ == "__main__":
         json.dump(results, sys.stdout, indent=2)
     frames = util.as_frames(results)
     if args.tables:
-        util.show_frames(frames, list(results[0]["params"].keys()))
+        util.show_frames(frames, list(Params.__dataclass_fields__))
@@ -1,12 +1,9 @@
 """Multiple workers occasionally interrupted."""
 
-from collections import defaultdict
 from dataclasses import dataclass
 from dataclasses_json import dataclass_json
-from itertools import count
 import json
-import random
-from simpy import Environment, Interrupt, Store
+from simpy import Interrupt
 import sys
 import util
 
@@ -24,22 +21,21 @@ class Params:
     t_sim: float = 200
 
 
-class Simulation(Environment):
+class Simulation(util.LeanEnvironment):
     def __init__(self):
         super().__init__()
         self.params = Params()
+        self.rng = util.Streams(self.params.n_seed)
+        self.registry = None
         self.queue = None
         self.coders = []
-        self.lengths = []
-        self.ages = []
 
     def simulate(self):
-        Recorder.reset()
-        self.queue = Store(self)
+        self.registry = util.Registry()
+        self.queue = util.TallyStore(self)
 
         self.process(Manager(self).run())
         self.process(Interrupter(self).run())
-        self.process(Monitor(self).run())
 
         self.coders = []
         for _ in range(self.params.n_coder):
@@ -50,36 +46,32 @@ class Simulation(Environment):
         self.run(until=self.params.t_sim)
 
     def result(self):
+        lengths, ages = util.downsample(self.queue, self.params.t_monitor, self.now)
         return {
-            "jobs": [job.json() for job in Recorder._all[Job]],
-            "lengths": self.lengths,
-            "ages": self.ages,
-            "coders": [coder.json() for coder in Recorder._all[Coder]],
+            "jobs": [job.json() for job in self.registry[Job]],
+            "lengths": lengths,
+            "ages": ages,
+            "queues": [util.queue_stats(self.queue, self.now)],
+            "coders": [coder.json() for coder in self.registry[Coder]],
         }
 
     def rand_interrupt_arrival(self):
-        return random.expovariate(1.0 / self.params.t_interrupt_interval)
+        return self.rng["interrupt_arrival"].expovariate(
+            1.0 / self.params.t_interrupt_interval
+        )
 
     def rand_job_arrival(self):
-        return random.expovariate(1.0 / self.params.t_job_interval)
+        return self.rng["job_arrival"].expovariate(1.0 / self.params.t_job_interval)
 
     def rand_job_duration(self):
-        return random.lognormvariate(self.params.t_job_mean, self.params.t_job_std)
+        return self.rng["job_duration"].lognormvariate(
+            self.params.t_job_mean, self.params.t_job_std
+        )
 
 
 class Recorder:
-    _next_id = defaultdict(count)
-    _all = defaultdict(list)
-
-    @staticmethod
-    def reset():
-        Recorder._next_id = defaultdict(count)
-        Recorder._all = defaultdict(list)
-
     def __init__(self, sim):
-        cls = self.__class__
-        self.id = next(self._next_id[cls])
-        self._all[cls].append(self)
+        self.id = sim.registry.add(self)
         self.sim = sim
 
     def json(self):
@@ -110,7 +102,7 @@ class Interrupter(Recorder):
     def run(self):
         while True:
             yield self.sim.timeout(self.sim.rand_interrupt_arrival())
-            coder = random.choice(self.sim.coders)
+            coder = self.sim.rng["interrupt_target"].choice(self.sim.coders)
             coder.proc.interrupt()
 
 
@@ -125,38 +117,29 @@ class Coder(Recorder):
 
     def run(self):
         while True:
+            job = None
+            req = self.sim.queue.get()
             try:
-                job = yield self.sim.queue.get()
+                job = yield req
                 job.t_start = self.sim.now
                 yield self.sim.timeout(job.duration)
                 job.t_end = self.sim.now
                 self.t_work += job.t_end - job.t_start
             except Interrupt:
                 self.n_interrupt += 1
+                if job is None:
+                    # Interrupted while idle: stop waiting and try again.
+                    req.cancel()
+                    continue
                 job.t_end = self.sim.now
                 job.discarded = True
             self.t_work += job.t_end - job.t_start
 
 
-class Monitor(Recorder):
-    def run(self):
-        while True:
-            now = self.sim.now
-            length = len(self.sim.queue.items)
-            self.sim.lengths.append({"time": now, "length": length})
-            mean_age = (
-                0
-                if length == 0
-                else sum((now - j.t_create) for j in self.sim.queue.items) / length
-            )
-            self.sim.ages.append({"time": now, "mean_age": mean_age})
-            yield self.sim.timeout(self.sim.params.t_monitor)
-
-
 if __name__ == "__main__":
     args, results = util.run(Params, Simulation)
     if args.json:
         json.dump(results, sys.stdout, indent=2)
     frames = util.as_frames(results)
     if args.tables:
-        util.show_frames(frames, list(results[0]["params"].keys()))
+        util.show_frames(frames, list(Params.__dataclass_fields__))
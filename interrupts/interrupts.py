@@ -1,12 +1,9 @@
 """Multiple workers occasionally interrupted."""
 
-from collections import defaultdict
 from dataclasses import dataclass
 from dataclasses_json import dataclass_json
-from itertools import count
 import json
-import random
-from simpy import Environment, Interrupt, Store
+from simpy import Interrupt
 import sys
 import util
 
@@ -26,19 +23,19 @@ class Params:
     t_sim: float = 200
 
 
-class Simulation(Environment):
+class Simulation(util.LeanEnvironment):
     def __init__(self):
         super().__init__()
         self.params = Params()
+        self.rng = util.Streams(self.params.n_seed)
+        self.registry = None
         self.code_queue = None
         self.coders = []
-        self.lengths = []
-        self.ages = []
         self.events = []
 
     def simulate(self):
-        Recorder.reset()
-        self.code_queue = Store(self)
+        self.registry = util.Registry()
+        self.code_queue = util.TallyStore(self)
         self.process(Manager(self).run())
         self.coders = []
         for _ in range(self.params.n_coder):
@@ -46,49 +43,46 @@ class Simulation(Environment):
             self.coders.append(coder)
             coder.proc = self.process(coder.run())
         self.process(Interrupter(self).run())
-        self.process(Monitor(self).run())
         self.run(until=self.params.t_sim)
 
     def result(self):
+        lengths, ages = util.downsample(
+            self.code_queue, self.params.t_monitor, self.now
+        )
         return {
             "jobs": [
-                *[job.json() for job in Recorder._all[JobRegular]],
-                *[job.json() for job in Recorder._all[JobInterrupt]],
+                *[job.json() for job in self.registry[JobRegular]],
+                *[job.json() for job in self.registry[JobInterrupt]],
             ],
             "events": self.events,
-            "lengths": self.lengths,
-            "ages": self.ages,
-            "coders": [coder.json() for coder in Recorder._all[Coder]],
+            "lengths": lengths,
+            "ages": ages,
+            "queues": [util.queue_stats(self.code_queue, self.now)],
+            "coders": [coder.json() for coder in self.registry[Coder]],
         }
 
     def rand_interrupt_arrival(self):
-        return random.expovariate(1.0 / self.params.t_interrupt_interval)
+        return self.rng["interrupt_arrival"].expovariate(
+            1.0 / self.params.t_interrupt_interval
+        )
 
     def rand_interrupt_duration(self):
-        return random.lognormvariate(
+        return self.rng["interrupt_duration"].lognormvariate(
             self.params.t_interrupt_mean, self.params.t_interrupt_std
         )
 
     def rand_job_arrival(self):
-        return random.expovariate(1.0 / self.params.t_job_interval)
+        return self.rng["job_arrival"].expovariate(1.0 / self.params.t_job_interval)
 
     def rand_job_duration(self):
-        return random.lognormvariate(self.params.t_job_mean, self.params.t_job_std)
+        return self.rng["job_duration"].lognormvariate(
+            self.params.t_job_mean, self.params.t_job_std
+        )
 
 
 class Recorder:
-    _next_id = defaultdict(count)
-    _all = defaultdict(list)
-
-    @staticmethod
-    def reset():
-        Recorder._next_id = defaultdict(count)
-        Recorder._all = defaultdict(list)
-
     def __init__(self, sim):
-        cls = self.__class__
-        self.id = next(self._next_id[cls])
-        self._all[cls].append(self)
+        self.id = sim.registry.add(self)
         self.sim = sim
 
     def json(self):
@@ -156,7 +150,7 @@ class Interrupter(Recorder):
     def run(self):
         while True:
             yield self.sim.timeout(self.sim.rand_interrupt_arrival())
-            coder = random.choice(self.sim.coders)
+            coder = self.sim.rng["interrupt_target"].choice(self.sim.coders)
             coder.proc.interrupt(JobInterrupt(self.sim))
 
 
@@ -201,25 +195,10 @@ class Coder(Recorder):
                 self.stack.append(job)
 
 
-class Monitor(Recorder):
-    def run(self):
-        while True:
-            now = self.sim.now
-            length = len(self.sim.code_queue.items)
-            self.sim.lengths.append({"time": now, "length": length})
-            mean_age = (
-                0
-                if length == 0
-                else sum((now - j.t_create) for j in self.sim.code_queue.items) / length
-            )
-            self.sim.ages.append({"time": now, "mean_age": mean_age})
-            yield self.sim.timeout(self.sim.params.t_monitor)
-
-
 if __name__ == "__main__":
     args, results = util.run(Params, Simulation)
     if args.json:
         json.dump(results, sys.stdout, indent=2)
     frames = util.as_frames(results)
     if args.tables:
-        util.show_frames(frames, list(results[0]["params"].keys()))
+        util.show_frames(frames, list(Params.__dataclass_fields__))
@@ -1,13 +1,9 @@
 """Generate JSON for generic simulation."""
 
-from collections import defaultdict
 from dataclasses import dataclass
 from dataclasses_json import dataclass_json
-from itertools import count
 import json
 import plotly.express as px
-import random
-from simpy import Environment, Store
 import sys
 import util
 
@@ -16,6 +12,7 @@ import util
 @dataclass
 class Params:
     n_seed: int = 13542
+    n_max_backlog: int = 1000
     t_job_interval: float = 2.0
     t_job_mean: float = 0.5
     t_job_std: float = 0.6
@@ -23,63 +20,73 @@ class Params:
     t_sim: float = 10
 
 
-class Simulation(Environment):
+class Simulation(util.LeanEnvironment):
     def __init__(self):
         super().__init__()
         self.params = Params()
-        self.queue = Store(self)
-        self.lengths = []
+        self.rng = util.Streams(self.params.n_seed)
+        self.registry = None
+        self.jobs = None
+        self.queue = util.TallyStore(self)
+        self.overflow = None
 
     def simulate(self):
-        Recorder.reset()
-        self.queue = Store(self)
+        self.registry = util.Registry()
+        self.jobs = util.Table(Job)
+        self.queue = util.TallyStore(self)
         self.process(Manager(self).run())
         self.process(Coder(self).run())
-        self.process(Monitor(self).run())
+        self.overflow = util.guard(self, [self.queue], self.params.n_max_backlog)
         self.run(until=self.params.t_sim)
 
     def result(self):
+        lengths, _ = util.downsample(self.queue, self.params.t_monitor, self.now)
         return {
-            "jobs": [job.json() for job in Recorder._all[Job]],
-            "lengths": self.lengths,
-            "coders": [coder.json() for coder in Recorder._all[Coder]],
+            "jobs": self.jobs.export(Job.SAVE_KEYS),
+            "lengths": lengths,
+            "coders": [coder.json() for coder in self.registry[Coder]],
+            "stability": [util.stability(self, self.overflow)],
         }
 
+    @staticmethod
+    def fast(params, seeds):
+        return util.lindley(params, seeds, ["jobs", "lengths", "coders"])
+
+    @staticmethod
+    def analytic(params):
+        return util.mgc(params)
+
     def rand_job_arrival(self):
-        return random.expovariate(1.0 / self.params.t_job_interval)
+        return self.rng["job_arrival"].expovariate(1.0 / self.params.t_job_interval)
 
     def rand_job_duration(self):
-        return random.lognormvariate(self.params.t_job_mean, self.params.t_job_std)
+        return self.rng["job_duration"].lognormvariate(
+            self.params.t_job_mean, self.params.t_job_std
+        )
 
 
 class Recorder:
-    _next_id = defaultdict(count)
-    _all = defaultdict(list)
-
-    @staticmethod
-    def reset():
-        Recorder._next_id = defaultdict(count)
-        Recorder._all = defaultdict(list)
-
     def __init__(self, sim):
-        cls = self.__class__
-        self.id = next(self._next_id[cls])
-        self._all[cls].append(self)
+        self.id = sim.registry.add(self)
         self.sim = sim
 
     def json(self):
         return {key: util.rnd(self, key) for key in self.SAVE_KEYS}
 
 
-class Job(Recorder):
+class Job:
+    __slots__ = ["id", "sim", "table"]
     SAVE_KEYS = ["t_create", "t_start", "t_complete"]
+    duration = util.Column()
+    t_create = util.Column()
+    t_start = util.Column()
+    t_complete = util.Column()
 
     def __init__(self, sim):
-        super().__init__(sim)
-        self.duration = self.sim.rand_job_duration()
-        self.t_create = self.sim.now
-        self.t_start = None
-        self.t_complete = None
+        self.sim = sim
+        sim.jobs.add(self)
+        self.duration = sim.rand_job_duration()
+        self.t_create = sim.now
 
 
 class Manager(Recorder):
@@ -106,23 +113,15 @@ class Coder(Recorder):
             self.t_work += job.t_complete - job.t_start
 
 
-class Monitor(Recorder):
-    def run(self):
-        while True:
-            self.sim.lengths.append(
-                {"time": self.sim.now, "length": len(self.sim.queue.items)}
-            )
-            yield self.sim.timeout(self.sim.params.t_monitor)
-
-
 if __name__ == "__main__":
     args, results = util.run(Params, Simulation)
     if args.json:
         json.dump(results, sys.stdout, indent=2)
     results = util.as_frames(results)
     jobs = util.df_jobs(results["jobs"])
-    throughput = util.df_throughput(results["jobs"])
-    utilization = util.df_utilization(results["coders"])
+    runs = results.get("stability")
+    throughput = util.df_throughput(results["jobs"], runs=runs)
+    utilization = util.df_utilization(results["coders"], runs=runs)
 
     fig_backlog = px.line(
         results["lengths"], x="time", y="length", color="t_job_interval"
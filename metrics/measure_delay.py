@@ -2,12 +2,10 @@
 
 from dataclasses import dataclass
 from dataclasses_json import dataclass_json
-from itertools import count
 import json
 import polars as pl
 import plotly.express as px
-import random
-from simpy import Environment, Store
+from simpy import Store
 import sys
 import util
 
@@ -22,49 +20,49 @@ class Params:
     t_sim: float = 10
 
 
-class Simulation(Environment):
+class Simulation(util.LeanEnvironment):
     def __init__(self):
         super().__init__()
         self.params = Params()
+        self.rng = util.Streams(self.params.n_seed)
+        self.jobs = None
         self.queue = Store(self)
 
     def simulate(self):
-        Job.reset()
+        self.jobs = util.Table(Job)
         self.queue = Store(self)
         self.process(manager(self))
         self.process(coder(self))
         self.run(until=self.params.t_sim)
 
     def result(self):
-        return {"jobs": [job.json() for job in Job._all]}
+        return {"jobs": self.jobs.export(Job.SAVE_KEYS)}
+
+    @staticmethod
+    def fast(params, seeds):
+        return util.lindley(params, seeds, ["jobs"])
 
     def rand_job_arrival(self):
-        return random.expovariate(1.0 / self.params.t_job_interval)
+        return self.rng["job_arrival"].expovariate(1.0 / self.params.t_job_interval)
 
     def rand_job_duration(self):
-        return random.lognormvariate(self.params.t_job_mean, self.params.t_job_std)
+        return self.rng["job_duration"].lognormvariate(
+            self.params.t_job_mean, self.params.t_job_std
+        )
 
 
 class Job:
+    __slots__ = ["id", "table"]
     SAVE_KEYS = ["t_create", "t_start", "t_complete"]
-    _next_id = count()
-    _all = []
-
-    @classmethod
-    def reset(cls):
-        cls._next_id = count()
-        cls._all = []
+    duration = util.Column()
+    t_create = util.Column()
+    t_start = util.Column()
+    t_complete = util.Column()
 
     def __init__(self, sim):
-        Job._all.append(self)
-        self.id = next(Job._next_id)
+        sim.jobs.add(self)
         self.duration = sim.rand_job_duration()
         self.t_create = sim.now
-        self.t_start = None
-        self.t_complete = None
-
-    def json(self):
-        return {key: util.rnd(self, key) for key in self.SAVE_KEYS}
 
 
 def manager(sim):
@@ -1,12 +1,9 @@
 """Explore effects of job priority."""
 
-from collections import defaultdict
 from dataclasses import dataclass
 from dataclasses_json import dataclass_json
-from itertools import count
+from itertools import compress
 import json
-import random
-from simpy import Environment, Store
 import sys
 import util
 
@@ -14,8 +11,10 @@ import util
 @dataclass_json
 @dataclass
 class Params:
+    n_iter: int = 1
     n_seed: int = 97531
     n_coder: int = 2
+    n_max_backlog: int = 1000
     t_integration: float = 0.2
     t_job_interval: float = 2.0
     t_job_mean: float = 0.5
@@ -24,18 +23,21 @@ class Params:
     t_sim: float = 200
 
 
-class Simulation(Environment):
+class Simulation(util.LeanEnvironment):
     def __init__(self):
         super().__init__()
         self.params = Params()
+        self.rng = util.Streams(self.params.n_seed)
+        self.registry = None
+        self.jobs = None
         self.queue = None
-        self.lengths = []
-        self.ages = []
         self.coders = []
+        self.overflow = None
 
     def simulate(self):
-        Recorder.reset()
-        self.queue = Store(self)
+        self.registry = util.Registry()
+        self.jobs = util.Table(Job)
+        self.queue = util.TallyStore(self)
         self.process(Manager(self).run())
 
         self.coders = []
@@ -43,55 +45,87 @@ class Simulation(Environment):
             self.coders.append(Coder(self))
             self.process(self.coders[-1].run())
 
-        self.process(Monitor(self).run())
+        self.overflow = util.guard(self, [self.queue], self.params.n_max_backlog)
         self.run(until=self.params.t_sim)
 
     def result(self):
+        lengths, ages = util.downsample(self.queue, self.params.t_monitor, self.now)
         return {
-            "jobs": [job.json() for job in Recorder._all[Job]],
-            "lengths": self.lengths,
-            "ages": self.ages,
-            "coders": [coder.json() for coder in Recorder._all[Coder]],
+            "jobs": self.jobs.export(Job.SAVE_KEYS),
+            "lengths": lengths,
+            "ages": ages,
+            "queues": [util.queue_stats(self.queue, self.now)],
+            "coders": [coder.json() for coder in self.registry[Coder]],
+            "stability": [util.stability(self, self.overflow, self.params.n_coder)],
         }
 
+    @staticmethod
+    def fast(params, seeds):
+        assert all(p.t_integration == 0 for p in params), (
+            "fast engine needs t_integration=0"
+        )
+        results = util.multi_server(
+            params,
+            seeds,
+            ["jobs", "integration", "lengths", "ages", "queues", "coders"],
+        )
+        for result in results:
+            jobs, integration = result["jobs"], result.pop("integration")
+            kinds = ["regular"] * len(jobs["t_create"])
+            kinds += ["integration"] * len(integration["t_create"])
+            result["jobs"] = {
+                "kind": kinds,
+                **{key: jobs[key] + integration[key] for key in jobs},
+            }
+        return results
+
+    @staticmethod
+    def analytic(params):
+        if params.t_integration > 0:
+            return None
+        return util.mgc(params, params.n_coder)
+
+    @staticmethod
+    def summarize(result):
+        # Integration jobs don't arrive from outside, so leave them out.
+        jobs = result["jobs"]
+        regular = [kind == "regular" for kind in jobs["kind"]]
+        jobs = {key: list(compress(values, regular)) for key, values in jobs.items()}
+        return util.summarize({**result, "jobs": jobs})
+
     def rand_job_arrival(self):
-        return random.expovariate(1.0 / self.params.t_job_interval)
+        return self.rng["job_arrival"].expovariate(1.0 / self.params.t_job_interval)
 
     def rand_job_duration(self):
-        return random.lognormvariate(self.params.t_job_mean, self.params.t_job_std)
+        return self.rng["job_duration"].lognormvariate(
+            self.params.t_job_mean, self.params.t_job_std
+        )
 
 
 class Recorder:
-    _next_id = defaultdict(count)
-    _all = defaultdict(list)
-
-    @staticmethod
-    def reset():
-        Recorder._next_id = defaultdict(count)
-        Recorder._all = defaultdict(list)
-
     def __init__(self, sim):
-        cls = self.__class__
-        self.id = next(self._next_id[cls])
-        self._all[cls].append(self)
+        self.id = sim.registry.add(self)
         self.sim = sim
 
     def json(self):
         return {key: util.rnd(self, key) for key in self.SAVE_KEYS}
 
 
-class Job(Recorder):
+class Job:
+    __slots__ = ["id", "sim", "table"]
     SAVE_KEYS = ["kind", "t_create", "t_start", "t_complete"]
+    kind = util.Column("regular", "integration")
+    duration = util.Column()
+    t_create = util.Column()
+    t_start = util.Column()
+    t_complete = util.Column()
 
     def __init__(self, sim, kind="regular", duration=None):
-        super().__init__(sim)
+        self.sim = sim
+        sim.jobs.add(self)
         self.kind = kind
-        self.duration = (
-            duration if duration is not None else self.sim.rand_job_duration()
-        )
-        self.t_create = self.sim.now
-        self.t_start = None
-        self.t_complete = None
+        self.duration = duration if duration is not None else sim.rand_job_duration()
+        self.t_create = sim.now
 
 
 class Manager(Recorder):
@@ -108,7 +142,7 @@ class Coder(Recorder):
     def __init__(self, sim):
         super().__init__(sim)
         self.t_work = 0
-        self.queue = Store(self.sim)
+        self.queue = util.SourceStore(self.sim)
 
     def run(self):
         while True:
@@ -124,31 +158,7 @@ class Coder(Recorder):
                     )
 
     def get(self):
-        new_req = self.sim.queue.get()
-        integrate_req = self.queue.get()
-        result = yield (new_req | integrate_req)
-        if (len(result.events) == 2) or (integrate_req in result):
-            new_req.cancel()
-            job = result[integrate_req]
-        else:
-            integrate_req.cancel()
-            job = result[new_req]
-        return job
-
-
-class Monitor(Recorder):
-    def run(self):
-        while True:
-            length = len(self.sim.queue.items)
-            self.sim.lengths.append({"time": self.sim.now, "length": length})
-            now = self.sim.now
-            mean_age = (
-                0
-                if length == 0
-                else sum((now - j.t_create) for j in self.sim.queue.items) / length
-            )
-            self.sim.ages.append({"time": self.sim.now, "mean_age": mean_age})
-            yield self.sim.timeout(self.sim.params.t_monitor)
+        return (yield util.get_any(self.queue, self.sim.queue))
 
 
 if __name__ == "__main__":
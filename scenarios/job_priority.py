@@ -1,13 +1,10 @@
 """Explore effects of job priority."""
 
-from collections import defaultdict
 from dataclasses import dataclass
 from dataclasses_json import dataclass_json
-from itertools import count
 import json
 import plotly.express as px
-import random
-from simpy import Environment, PriorityStore
+import polars as pl
 import sys
 import util
 
@@ -15,7 +12,9 @@ import util
 @dataclass_json
 @dataclass
 class Params:
+    n_iter: int = 1
     n_seed: int = 97531
+    n_max_backlog: int = 1000
     policy: str = "shortest"
     t_job_interval: float = 2.0
     t_job_mean: float = 0.5
@@ -24,78 +23,72 @@ class Params:
     t_sim: float = 200
 
 
-class Simulation(Environment):
+class Simulation(util.LeanEnvironment):
     def __init__(self):
         super().__init__()
         self.params = Params()
+        self.rng = util.Streams(self.params.n_seed)
+        self.registry = None
+        self.jobs = None
         self.queue = None
-        self.lengths = []
-        self.ages = []
+        self.overflow = None
 
     def simulate(self):
-        Recorder.reset()
-        self.queue = PriorityStore(self)
+        self.registry = util.Registry()
+        self.jobs = util.Table(Job)
+        self.queue = util.TallyPriorityStore(self, policy=self.params.policy)
         self.process(Manager(self).run())
         self.process(Coder(self).run())
-        self.process(Monitor(self).run())
+        self.overflow = util.guard(self, [self.queue], self.params.n_max_backlog)
         self.run(until=self.params.t_sim)
 
     def result(self):
+        lengths, ages = util.downsample(self.queue, self.params.t_monitor, self.now)
         return {
-            "jobs": [job.json() for job in Recorder._all[Job]],
-            "lengths": self.lengths,
-            "ages": self.ages,
-            "coders": [coder.json() for coder in Recorder._all[Coder]],
+            "jobs": self.jobs.export(Job.SAVE_KEYS),
+            "lengths": lengths,
+            "ages": ages,
+            "queues": [util.queue_stats(self.queue, self.now)],
+            "coders": [coder.json() for coder in self.registry[Coder]],
+            "stability": [util.stability(self, self.overflow)],
         }
 
+    @staticmethod
+    def analytic(params):
+        # Other policies change who waits, which these formulas don't model.
+        return util.mgc(params) if params.policy == "oldest" else None
+
     def rand_job_arrival(self):
-        return random.expovariate(1.0 / self.params.t_job_interval)
+        return self.rng["job_arrival"].expovariate(1.0 / self.params.t_job_interval)
 
     def rand_job_duration(self):
-        return random.lognormvariate(self.params.t_job_mean, self.params.t_job_std)
+        return self.rng["job_duration"].lognormvariate(
+            self.params.t_job_mean, self.params.t_job_std
+        )
 
 
 class Recorder:
-    _next_id = defaultdict(count)
-    _all = defaultdict(list)
-
-    @staticmethod
-    def reset():
-        Recorder._next_id = defaultdict(count)
-        Recorder._all = defaultdict(list)
-
     def __init__(self, sim):
-        cls = self.__class__
-        self.id = next(self._next_id[cls])
-        self._all[cls].append(self)
+        self.id = sim.registry.add(self)
         self.sim = sim
 
     def json(self):
         return {key: util.rnd(self, key) for key in self.SAVE_KEYS}
 
 
-class Job(Recorder):
+class Job:
+    __slots__ = ["id", "sim", "table"]
     SAVE_KEYS = ["t_create", "t_start", "t_complete"]
+    duration = util.Column()
+    t_create = util.Column()
+    t_start = util.Column()
+    t_complete = util.Column()
 
     def __init__(self, sim):
-        super().__init__(sim)
-        self.duration = self.sim.rand_job_duration()
-        self.t_create = self.sim.now
-        self.t_start = None
-        self.t_complete = None
-
-    def __lt__(self, other):
-        match self.sim.params.policy:
-            case "oldest":
-                return self.t_create < other.t_create
-            case "newest":
-                return other.t_create < self.t_create
-            case "shortest":
-                return self.duration < other.duration
-            case "longest":
-                return other.duration < self.duration
-            case _:
-                assert False, f"unknown policy {self.sim.params.policy}"
+        self.sim = sim
+        sim.jobs.add(self)
+        self.duration = sim.rand_job_duration()
+        self.t_create = sim.now
 
 
 class Manager(Recorder):
@@ -122,21 +115,6 @@ class Coder(Recorder):
             self.t_work += job.t_complete - job.t_start
 
 
-class Monitor(Recorder):
-    def run(self):
-        while True:
-            length = len(self.sim.queue.items)
-            self.sim.lengths.append({"time": self.sim.now, "length": length})
-            now = self.sim.now
-            mean_age = (
-                0
-                if length == 0
-                else sum((now - j.t_create) for j in self.sim.queue.items) / length
-            )
-            self.sim.ages.append({"time": self.sim.now, "mean_age": mean_age})
-            yield self.sim.timeout(self.sim.params.t_monitor)
-
-
 if __name__ == "__main__":
     args, results = util.run(Params, Simulation)
     if args.json:
@@ -144,11 +122,39 @@ if __name__ == "__main__":
 
     results = util.as_frames(results)
     jobs = util.df_jobs(results["jobs"])
-    throughput = util.df_throughput(results["jobs"], group_col="policy")
-    utilization = util.df_utilization(results["coders"], group_col="policy")
+    runs = results.get("stability")
+    throughput = util.df_throughput(results["jobs"], group_col="policy", runs=runs)
+    utilization = util.df_utilization(results["coders"], group_col="policy", runs=runs)
 
     if args.tables:
         util.show_through_util(throughput, utilization)
+        # Pairs only mean something if each policy saw the same jobs.
+        if args.crn and jobs["n_iter"].n_unique() > 1:
+            delay = jobs.group_by(["policy", "n_iter"]).agg(pl.col("delay").mean())
+            # Scenarios are numbered in command-line order, so the first
+            # scenario has the first policy given.
+            baseline = results["stability"].sort("iter")["policy"][0]
+            paired = util.df_paired(delay, "policy", "delay", baseline)
+            util.show_frames({f"delay compared to {baseline}": paired}, [])
+        # Confidence intervals from within each run: use a long t_sim.
+        # Batches span [0, t_sim], so leave out runs that stopped early.
+        stable = util.df_stable(results["jobs"], runs)
+        by_run = ["policy", "n_iter"]
+        if not stable.is_empty():
+            util.show_frames(
+                {
+                    "throughput (batch means)": util.df_batch_throughput(
+                        stable, group_col=by_run
+                    ),
+                    "utilization (batch means)": util.df_batch_utilization(
+                        stable, group_col=by_run
+                    ),
+                    "delay (batch means)": util.df_batch_means(
+                        util.df_jobs(stable), "t_create", "delay", group_col=by_run
+                    ),
+                },
+                [],
+            )
 
     fig_ages = px.line(results["ages"], x="time", y="mean_age", facet_col="policy")
     fig_backlog = px.line(results["lengths"], x="time", y="length", facet_col="policy")
@@ -1,12 +1,8 @@
 """Multiple workers re-doing work with jobs going back to authors."""
 
-from collections import defaultdict
 from dataclasses import dataclass
 from dataclasses_json import dataclass_json
-from itertools import count
 import json
-import random
-from simpy import Environment, Store
 import sys
 import util
 
@@ -25,21 +21,21 @@ class Params:
     t_sim: float = 200
 
 
-class Simulation(Environment):
+class Simulation(util.LeanEnvironment):
     def __init__(self):
         super().__init__()
         self.params = Params()
+        self.rng = util.Streams(self.params.n_seed)
+        self.registry = None
         self.code_queue = None
         self.test_queue = None
         self.events = []
         self.coders = []
-        self.lengths = []
-        self.ages = []
 
     def simulate(self):
-        Recorder.reset()
-        self.code_queue = Store(self)
-        self.test_queue = Store(self)
+        self.registry = util.Registry()
+        self.code_queue = util.TallyStore(self)
+        self.test_queue = util.TallyStore(self)
 
         self.process(Manager(self).run())
 
@@ -52,47 +48,54 @@ class Simulation(Environment):
         for _ in range(self.params.n_tester):
             self.process(Tester(self).run())
 
-        self.process(Monitor(self).run())
         self.run(until=self.params.t_sim)
 
     def finalize(self):
-        for job in Recorder._all[Job]:
+        for job in self.registry[Job]:
             if not job.complete:
                 job.update("incomplete")
 
     def result(self):
         self.finalize()
+        lengths, ages, queues = [], [], []
+        for name, queue in (("code", self.code_queue), ("test", self.test_queue)):
+            sampled = util.downsample(queue, self.params.t_monitor, self.now, name=name)
+            lengths.extend(sampled[0])
+            ages.extend(sampled[1])
+            queues.append(util.queue_stats(queue, self.now, name=name))
         return {
             "events": self.events,
-            "lengths": self.lengths,
-            "ages": self.ages,
-            "coders": [coder.json() for coder in Recorder._all[Coder]],
-            "testers": [tester.json() for tester in Recorder._all[Tester]],
+            "lengths": lengths,
+            "ages": ages,
+            "queues": queues,
+            "coders": [coder.json() for coder in self.registry[Coder]],
+            "testers": [tester.json() for tester in self.registry[Tester]],
         }
 
+    @staticmethod
+    def analytic(params):
+        estimates = util.rework(params)
+        return None if estimates is None else estimates["summary"]
+
+    @staticmethod
+    def summarize(result):
+        return util.measure_rework(result)["summary"]
+
     def rand_job_arrival(self):
-        return random.expovariate(1.0 / self.params.t_job_interval)
+        return self.rng["job_arrival"].expovariate(1.0 / self.params.t_job_interval)
 
     def rand_job_duration(self):
-        return random.lognormvariate(self.params.t_job_mean, self.params.t_job_std)
+        return self.rng["job_duration"].lognormvariate(
+            self.params.t_job_mean, self.params.t_job_std
+        )
 
     def rand_rework(self):
-        return random.uniform(0, 1) < self.params.p_rework
+        return self.rng["rework"].uniform(0, 1) < self.params.p_rework
 
 
 class Recorder:
-    _next_id = defaultdict(count)
-    _all = defaultdict(list)
-
-    @staticmethod
-    def reset():
-        Recorder._next_id = defaultdict(count)
-        Recorder._all = defaultdict(list)
-
     def __init__(self, sim):
-        cls = self.__class__
-        self.id = next(self._next_id[cls])
-        self._all[cls].append(self)
+        self.id = sim.registry.add(self)
         self.sim = sim
 
     def json(self):
@@ -129,7 +132,7 @@ class Coder(Recorder):
 
     def __init__(self, sim):
         super().__init__(sim)
-        self.queue = Store(self.sim)
+        self.queue = util.SourceStore(self.sim)
         self.t_work = 0
 
     def run(self):
@@ -141,16 +144,11 @@ class Coder(Recorder):
             yield self.sim.test_queue.put(job)
 
     def get(self):
-        new_req = self.sim.code_queue.get()
-        rework_req = self.queue.get()
-        result = yield (new_req | rework_req)
-        if (len(result.events) == 2) or (rework_req in result):
-            new_req.cancel()
-            job = result[rework_req]
+        req = util.get_any(self.queue, self.sim.code_queue)
+        job = yield req
+        if req.source is self.queue:
             assert job.coder_id == self.id
         else:
-            rework_req.cancel()
-            job = result[new_req]
             assert job.coder_id is None
             job.coder_id = self.id
         return job
@@ -177,23 +175,9 @@ class Tester(Recorder):
                 job.t_complete = self.sim.now
 
 
-class Monitor(Recorder):
-    def run(self):
-        all_queues = (("code", self.sim.code_queue), ("test", self.sim.test_queue))
-        while True:
-            now = self.sim.now
-            for name, queue in all_queues:
-                length = len(queue.items)
-                self.sim.lengths.append({"time": now, "name": name, "length": length})
-                mean_age = (
-                    0
-                    if length == 0
-                    else sum((now - j.t_create) for j in queue.items) / length
-                )
-                self.sim.ages.append({"time": now, "name": name, "mean_age": mean_age})
-            yield self.sim.timeout(self.sim.params.t_monitor)
-
-
 if __name__ == "__main__":
     args, results = util.run(Params, Simulation)
-    json.dump(results, sys.stdout, indent=2)
+    if args.tables:
+        util.show_frames(util.compare_rework(results), [])
+    else:
+        json.dump(results, sys.stdout, indent=2)
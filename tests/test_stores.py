@@ -0,0 +1,48 @@
+"""Tests for the instrumented stores."""
+
+import unittest
+
+from utilities.kernel import LeanEnvironment
+from utilities.stores import TallyStore
+
+
+class Job:
+    def __init__(self, t_create):
+        self.t_create = t_create
+
+
+class TestTallyMaxLength(unittest.TestCase):
+    def test_job_handed_to_waiting_getter_is_not_queued(self):
+        env = LeanEnvironment()
+        queue = TallyStore(env)
+        received = []
+
+        def coder():
+            received.append((yield queue.get()))
+
+        def manager():
+            yield env.timeout(1)
+            yield queue.put(Job(env.now))
+
+        env.process(coder())
+        env.process(manager())
+        env.run()
+        self.assertEqual(len(received), 1)
+        self.assertEqual(queue.max_length, 0)
+
+    def test_jobs_left_in_store_are_queued(self):
+        env = LeanEnvironment()
+        queue = TallyStore(env)
+
+        def manager():
+            yield queue.put(Job(env.now))
+            yield env.timeout(1)
+            yield queue.put(Job(env.now))
+
+        env.process(manager())
+        env.run()
+        self.assertEqual(queue.max_length, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,38 +1,97 @@
 """Utilities."""
 
 import argparse
-from itertools import product
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+import hashlib
+from itertools import product, repeat
+import json
 import polars as pl
-import random
 import sys
 
+from utilities.analytic import (  # noqa: F401
+    compare_rework,
+    erlang_c,
+    measure_rework,
+    mean_wait,
+    mgc,
+    open_network,
+    rework,
+    rework_transitions,
+    summarize,
+)
+from utilities.batch import (  # noqa: F401
+    batch_means,
+    df_batch_means,
+    df_batch_throughput,
+    df_batch_utilization,
+)
+from utilities.cache import ResultCache
+from utilities.engines import lindley, multi_server, tandem  # noqa: F401
+from utilities.frames import FrameBuilder
+from utilities.kernel import LeanEnvironment  # noqa: F401
+from utilities.schedulers import SCHEDULERS
+from utilities.policies import POLICIES, policy, sort_key  # noqa: F401
+from utilities.sink import Sink
+from utilities import stopping
+from utilities.stores import (  # noqa: F401
+    SourcePriorityStore,
+    SourceStore,
+    TallyPriorityStore,
+    TallyStore,
+    downsample,
+    get_any,
+    queue_stats,
+)
+from utilities.stability import (  # noqa: F401
+    MAX_BACKLOG,
+    df_stable,
+    guard,
+    offered_load,
+    stability,
+    with_t_stop,
+)
+from utilities.streams import Streams
+from utilities.table import Column, Registry, Table  # noqa: F401
+from utilities.warmup import (  # noqa: F401
+    df_steady_throughput,
+    df_truncate,
+    df_warmup,
+    mser,
+)
+
 PRECISION = 2
 
 
-def as_frames(results):
+def as_frames(results, lazy=False):
     """Convert JSON to dataframes."""
 
-    for i, res in enumerate(results):
-        for key in res:
-            if key == "params":
-                continue
-            res[key] = pl.from_dicts(res[key])
-            res[key] = res[key].with_columns(pl.lit(i).alias("iter"))
-            for name, value in res["params"].items():
-                res[key] = res[key].with_columns(pl.lit(value).alias(name))
-
-    frames = {}
-    for key in results[0]:
-        if key == "params":
-            continue
-        frames[key] = pl.concat(r[key] for r in results)
+    if isinstance(results, Sink):
+        frames = results.scan()
+        return frames if lazy else {key: df.collect() for key, df in frames.items()}
 
-    return frames
+    if isinstance(results, FrameBuilder):
+        return results.build()
 
+    builder = FrameBuilder()
+    for result in results:
+        builder.append(result)
+    return builder.build()
 
-def df_smooth(df, col_by, col_ave):
-    result = df.group_by(col_by).agg(pl.col(col_ave).mean().alias(col_ave)).sort(col_by)
-    return result
+
+def df_smooth(df, col_by, col_ave, pairs=False):
+    """Average `col_ave` over iterations for each value of `col_by`.
+
+    With `pairs` the iterations are antithetic pairs, so each pair is
+    averaged first and the standard error `se` is found from the pair
+    means, which are independent even though the two halves are not.
+    """
+
+    if not pairs:
+        return (
+            df.group_by(col_by).agg(pl.col(col_ave).mean().alias(col_ave)).sort(col_by)
+        )
+    return _pair_means(df, col_by, col_ave)
 
 
 def df_jobs(jobs):
@@ -43,40 +102,111 @@ def df_jobs(jobs):
     )
 
 
-def df_throughput(jobs, group_col="iter"):
+def df_paired(df, col_by, col_value, baseline, col_pair="n_iter"):
+    """Paired differences of `col_value` from the `baseline` level of `col_by`.
+
+    Rows are matched on `col_pair`, so with common random numbers each
+    difference compares scenarios that saw the same jobs. Gives the number
+    of pairs and the mean and standard error of the differences.
+    """
+
+    base = df.filter(pl.col(col_by) == baseline).select(
+        col_pair, pl.col(col_value).alias("baseline")
+    )
     return (
-        df_jobs(jobs)
-        .filter(pl.col("t_complete").is_not_null())
-        .group_by(group_col)
+        df.filter(pl.col(col_by) != baseline)
+        .join(base, on=col_pair)
+        .with_columns((pl.col(col_value) - pl.col("baseline")).alias("diff"))
+        .group_by(col_by)
+        .agg(
+            pl.len().alias("n"),
+            pl.col("diff").mean().alias("mean_diff"),
+            (pl.col("diff").std() / pl.len().sqrt()).alias("se_diff"),
+        )
+        .sort(col_by)
+    )
+
+
+def df_throughput(jobs, group_col="iter", pairs=False, runs=None):
+    """Completed jobs per unit time for each value of `group_col`.
+
+    With `pairs` the throughput of each iteration is found first and then
+    averaged over antithetic pairs as in `df_smooth`. If `runs` is the
+    "stability" table, runs stopped early are measured up to their `t_stop`
+    and a `stable` column says whether every run in the group finished.
+    """
+
+    jobs = with_t_stop(df_jobs(jobs), runs).filter(pl.col("t_complete").is_not_null())
+    if pairs:
+        assert group_col != "iter", "group antithetic pairs by a parameter"
+        per_iter = jobs.group_by(group_col, "iter", "n_iter").agg(
+            (pl.len() / pl.col("t_stop").first()).alias("throughput")
+        )
+        means = _pair_means(per_iter, group_col, "throughput")
+        if runs is None:
+            return means
+        stable = jobs.group_by(group_col).agg(_all_stable(runs))
+        return means.join(stable, on=group_col).sort(group_col)
+    return (
+        jobs.group_by(group_col)
         .agg(
             [
                 pl.col("t_sim").first(),
                 pl.len().alias("num_jobs"),
+                # Mean length of the group's runs, one value per run.
+                pl.col("t_stop").gather(pl.col("iter").arg_unique()).mean(),
+                *_all_stable(runs),
             ]
         )
         .with_columns(
-            (pl.col("num_jobs") / pl.col("t_sim")).round(PRECISION).alias("throughput")
+            (pl.col("num_jobs") / pl.col("t_stop")).round(PRECISION).alias("throughput")
         )
+        .drop("t_stop")
         .sort(group_col)
     )
 
 
-def df_utilization(coders, group_col="iter"):
+def df_utilization(coders, group_col="iter", runs=None):
+    """Fraction of time coders were busy for each value of `group_col`.
+
+    Runs stopped early are measured up to `t_stop` as in `df_throughput`.
+    """
+
     return (
-        coders.group_by(group_col)
+        with_t_stop(coders, runs)
+        .group_by(group_col)
         .agg(
             [
                 pl.col("t_sim").first(),
-                pl.len().alias("count"),
                 pl.col("t_work").sum().alias("total_work"),
+                *_all_stable(runs),
+                (pl.col("t_work").sum() / pl.col("t_stop").sum())
+                .round(PRECISION)
+                .alias("utilization"),
             ]
         )
-        .with_columns(
-            (pl.col("total_work") / (pl.col("count") * pl.col("t_sim")))
-            .round(PRECISION)
-            .alias("utilization")
+    )
+
+
+def _all_stable(runs):
+    """Aggregate saying whether all of a group's runs finished, if known."""
+
+    return [] if runs is None else [pl.col("stable").all()]
+
+
+def _pair_means(df, col_by, col_value):
+    """Mean and standard error of `col_value` over antithetic pairs."""
+
+    return (
+        df.group_by(col_by, (pl.col("n_iter") // 2).alias("pair"))
+        .agg(pl.col(col_value).mean())
+        .group_by(col_by)
+        .agg(
+            pl.col(col_value).mean(),
+            pl.len().alias("n_pairs"),
+            (pl.col(col_value).std() / pl.len().sqrt()).alias("se"),
         )
-        .drop("count")
+        .sort(col_by)
     )
 
 
@@ -86,24 +216,128 @@ def rnd(obj, key=None):
     return round(value, PRECISION) if isinstance(value, float) else value
 
 
-def run(params_cls, simulation_cls):
-    """Run simulation for each combination of parameters."""
+def run(params_cls, simulation_cls, sink=None):
+    """Run simulation for each combination of parameters.
+
+    Results are appended to `sink` (anything with an `append` method) in
+    scenario order as they finish; by default this is a list, or a
+    `Sink` writing to disk if `--sink` was given. With `--analytic` or
+    `--hybrid` the summary is shown and the program exits without
+    returning.
+    """
 
     args, params, options = _parse_args(params_cls)
     if args.params:
         _show_params(params_cls)
         sys.exit(0)
 
-    random.seed(params.n_seed)
+    if sink is None:
+        sink = [] if args.sink is None else Sink(args.sink)
+    assert not (args.json and isinstance(sink, Sink)), "can't show JSON from a sink"
+
     scenarios = _create_scenarios(params, options)
+    seeding = Seeding(crn=args.crn, antithetic=args.antithetic)
+    cache = None
+    if args.analytic or args.hybrid:
+        assert hasattr(simulation_cls, "analytic"), "no analytic model for simulation"
+        assert args.target is None, (
+            "stopping rules don't apply to closed-form estimates"
+        )
+        assert not args.fast, "closed-form estimates don't use the fast engine"
+        # The summary is shown here and the script's own output is skipped.
+        assert not (args.tables or args.figure), (
+            "closed-form estimates are shown as a summary table or with --json"
+        )
+    if args.analytic:
+        execute = None
+    elif args.fast:
+        assert hasattr(simulation_cls, "fast"), "no fast engine for this simulation"
+        assert not args.antithetic, "antithetic pairs need the SimPy engine"
+        execute = partial(_run_fast, simulation_cls, seeding=seeding)
+    else:
+        cache = None if args.no_cache else ResultCache(simulation_cls)
+        pool_cls = ThreadPoolExecutor if args.threads else ProcessPoolExecutor
+        execute = partial(
+            _generate,
+            simulation_cls,
+            workers=args.workers,
+            pool_cls=pool_cls,
+            cache=cache,
+            seeding=seeding,
+            scheduler=args.scheduler,
+        )
+    if args.analytic or args.hybrid:
+        results = _run_analytic(simulation_cls, scenarios, seeding, execute)
+    elif args.target is None:
+        results = execute(scenarios)
+    else:
+        assert hasattr(params, "n_iter"), "stopping rules need an n_iter parameter"
+        results = _run_sequential(execute, scenarios, args)
+    try:
+        for result in results:
+            sink.append(result)
+    finally:
+        if isinstance(sink, Sink):
+            sink.close()
+
+    if cache is not None:
+        cache.evict()
+
+    if args.analytic or args.hybrid:
+        _show_summary(args, sink, params_cls, options)
+        sys.exit(0)
 
-    results = []
-    for scenario in scenarios:
-        sim = _create_simulation(simulation_cls, scenario)
-        sim.simulate()
-        results.append({"params": sim.params.to_dict(), **sim.result()})
+    return args, sink
+
+
+def scenario_seed(params, crn=False, antithetic=False):
+    """Derive a scenario's own seed from its parameters.
 
-    return args, results
+    `params` is a dictionary of every parameter's value. The seed comes
+    from `n_seed` and the others, so spelling out a default doesn't
+    change it. With common random numbers (`crn`) only the iteration
+    number is used, so every policy or parameter value in a sweep sees
+    the same jobs. With `antithetic` pairs, iterations 2k and 2k+1 share
+    a seed.
+    """
+
+    # Depends only on the scenario (including its iteration number), so the
+    # scenario's result doesn't depend on what else is in the sweep.
+    keep = {"n_iter"} if crn else set(params) - {"n_seed"}
+    values = sorted((k, v) for k, v in params.items() if k in keep)
+    if antithetic:
+        values = [(k, v // 2 if k == "n_iter" else v) for k, v in values]
+    key = json.dumps([params["n_seed"], values])
+    return int.from_bytes(hashlib.sha256(key.encode()).digest()[:8])
+
+
+class Seeding:
+    """How each scenario's random numbers are chosen.
+
+    Iteration 2k+1 of an antithetic run uses the same seed as 2k but
+    transforms each uniform u to 1 - u.
+    """
+
+    def __init__(self, crn=False, antithetic=False):
+        self.crn = crn
+        self.antithetic = antithetic
+
+    def seed(self, params):
+        """The seed for a scenario with these parameters."""
+        return scenario_seed(params.to_dict(), self.crn, self.antithetic)
+
+    def flipped(self, params):
+        """Is this the second member of an antithetic pair?"""
+        return self.antithetic and getattr(params, "n_iter", 0) % 2 == 1
+
+    def key(self, params):
+        """Seed as used in cache keys, marking flipped streams."""
+        seed = self.seed(params)
+        return [seed, "antithetic"] if self.flipped(params) else seed
+
+    def streams(self, params):
+        """Random streams for a scenario with these parameters."""
+        return Streams(self.seed(params), self.flipped(params))
 
 
 def show_frames(frames, without):
@@ -137,6 +371,48 @@ def show_through_util(throughput, utilization):
         print(utilization)
 
 
+def _generate(
+    simulation_cls, scenarios, workers, pool_cls, cache, seeding, scheduler=None
+):
+    """Generate results in scenario order, simulating only uncached ones.
+
+    Results don't depend on the `scheduler`, so it isn't part of cache keys.
+    """
+
+    keys = [None] * len(scenarios)
+    if cache is not None:
+        keys = [_cache_key(cache, simulation_cls, s, seeding) for s in scenarios]
+    missing = [i for i, key in enumerate(keys) if (key is None) or not cache.has(key)]
+
+    todo = [scenarios[i] for i in missing]
+    if workers > 1:
+        computed = _run_parallel(
+            simulation_cls, todo, workers, pool_cls, seeding, scheduler
+        )
+    else:
+        computed = (_run_scenario(simulation_cls, s, seeding, scheduler) for s in todo)
+
+    missing = set(missing)
+    for i, (scenario, key) in enumerate(zip(scenarios, keys)):
+        if i in missing:
+            result = next(computed)
+            if cache is not None:
+                cache.put(key, result)
+        else:
+            result = cache.get(key)
+            if result is None:
+                result = _run_scenario(simulation_cls, scenario, seeding, scheduler)
+        yield result
+
+
+def _cache_key(cache, simulation_cls, scenario, seeding):
+    """Cache key for a scenario: code, parameters, and seed."""
+
+    sim = _create_simulation(simulation_cls, scenario, seeding)
+    params = sim.params.to_dict()
+    return cache.key(params, seeding.key(sim.params))
+
+
 def _create_scenarios(params, options):
     """Create all possible scenarios from parameters."""
 
@@ -157,24 +433,228 @@ def _create_scenarios(params, options):
     return scenarios
 
 
-def _create_simulation(simulation_cls, scenario):
+def _create_simulation(simulation_cls, scenario, seeding, scheduler=None):
     """Create a simulation with one scenario's parameter values."""
 
     sim = simulation_cls()
+    if scheduler is not None:
+        sim.use_scheduler(scheduler)
     for key, value in scenario.items():
         assert hasattr(sim.params, key), f"unknown parameter key {key}"
         setattr(sim.params, key, value)
+    sim.rng = seeding.streams(sim.params)
     return sim
 
 
+def _run_parallel(simulation_cls, scenarios, workers, pool_cls, seeding, scheduler):
+    """Run scenarios in a pool of workers, keeping scenario order."""
+
+    chunksize = max(1, len(scenarios) // (4 * workers))
+    with pool_cls(max_workers=workers) as pool:
+        yield from pool.map(
+            _run_scenario,
+            repeat(simulation_cls),
+            scenarios,
+            repeat(seeding),
+            repeat(scheduler),
+            chunksize=chunksize,
+        )
+
+
+def _run_analytic(simulation_cls, scenarios, seeding, execute=None):
+    """Use the simulation's closed-form estimates where it has them.
+
+    Each result has a "summary" table with one row saying which method
+    was used. Scenarios the formulas don't cover are simulated with
+    `execute` if it is given (hybrid mode) and summarized the same way,
+    by the simulation's own `summarize` method if it has one.
+    """
+
+    measure = getattr(simulation_cls, "summarize", summarize)
+
+    params = [_create_simulation(simulation_cls, s, seeding).params for s in scenarios]
+    estimates = [simulation_cls.analytic(p) for p in params]
+    simulated = iter(())
+    if execute is not None:
+        todo = [s for s, estimate in zip(scenarios, estimates) if estimate is None]
+        simulated = iter(execute(todo))
+
+    # Estimates don't depend on the iteration, so give one per scenario.
+    seen = set()
+    for scenario, p, estimate in zip(scenarios, params, estimates):
+        if estimate is None and execute is not None:
+            result = next(simulated)
+            result["summary"] = [{"method": "simulation", **measure(result)}]
+            yield result
+            continue
+        key = _scenario_key(scenario)
+        if key in seen:
+            continue
+        seen.add(key)
+        if estimate is not None:
+            summary = {"method": "analytic", **estimate}
+            yield {"params": p.to_dict(), "summary": [summary]}
+        else:
+            yield {"params": p.to_dict(), "summary": [{"method": "unavailable"}]}
+
+
+def _show_summary(args, sink, params_cls, options):
+    """Show analytic or hybrid summaries instead of the script's own output."""
+
+    if isinstance(sink, Sink):
+        return
+    if args.json:
+        json.dump(sink, sys.stdout, indent=2)
+        return
+    fields = params_cls.__dataclass_fields__
+    fixed = [key for key in fields if len(options.get(key, [])) < 2]
+    show_frames({"summary": as_frames(sink)["summary"]}, ["iter", *fixed])
+
+
+def _run_fast(simulation_cls, scenarios, seeding):
+    """Run scenarios with the simulation's vectorized engine.
+
+    Scenarios that differ only in their iteration are simulated together
+    in one call. Results are neither cached nor run in parallel.
+    """
+
+    groups = {}
+    for i, scenario in enumerate(scenarios):
+        groups.setdefault(_scenario_key(scenario), []).append(i)
+
+    results = [None] * len(scenarios)
+    for indices in groups.values():
+        params = [
+            _create_simulation(simulation_cls, scenarios[i], seeding).params
+            for i in indices
+        ]
+        seeds = [seeding.seed(p) for p in params]
+        common = params[0].to_dict()
+        for i, result in zip(indices, simulation_cls.fast(params, seeds)):
+            results[i] = {"params": {**common, **scenarios[i]}, **result}
+    return results
+
+
+def _scenario_key(scenario):
+    """A scenario's parameter values other than its iteration, as a string."""
+
+    others = {k: v for k, v in scenario.items() if k != "n_iter"}
+    return json.dumps(others, sort_keys=True)
+
+
+def _run_sequential(execute, scenarios, args):
+    """Run batches of iterations of each scenario until `args.target` is precise.
+
+    Each distinct scenario (ignoring `n_iter`) gets batches of iterations
+    until the confidence interval for the mean of the target metric is
+    within `args.precision` of it or `args.max_iter` iterations have been
+    run. The number of iterations needed is reported on standard error.
+    """
+
+    pairs = args.antithetic
+    assert not (pairs and args.batch % 2), "antithetic batches must be even"
+    bases = {}
+    for scenario in scenarios:
+        base = {k: v for k, v in scenario.items() if k != "n_iter"}
+        bases.setdefault(json.dumps(base, sort_keys=True), base)
+
+    for base in bases.values():
+        values = []
+        n_iter = 0
+        while n_iter < args.max_iter:
+            size = min(args.batch, args.max_iter - n_iter)
+            batch = [{**base, "n_iter": n_iter + i} for i in range(size)]
+            results = list(execute(batch))
+            yield from results
+            values.extend(stopping.measure(args.target, results, pairs))
+            n_iter += size
+            if stopping.precise(values, args.precision):
+                break
+        _report_sequential(base, n_iter, values, args)
+
+
+def _report_sequential(base, n_iter, values, args):
+    label = ", ".join(f"{k}={v}" for k, v in base.items()) or "default"
+    mean = sum(values) / len(values) if values else float("nan")
+    half = stopping.half_width(values)
+    capped = "" if stopping.precise(values, args.precision) else " (cap reached)"
+    print(
+        f"{label}: {n_iter} iterations{capped}, {args.target} {mean:.4g} ± {half:.2g}",
+        file=sys.stderr,
+    )
+
+
+def _run_scenario(simulation_cls, scenario, seeding, scheduler=None):
+    """Simulate a single scenario and return its result."""
+
+    sim = _create_simulation(simulation_cls, scenario, seeding, scheduler)
+    sim.simulate()
+    return {"params": sim.params.to_dict(), **sim.result()}
+
+
 def _parse_args(params_cls):
     """Parse command-line arguments."""
 
     parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--analytic",
+        action="store_true",
+        help="show closed-form estimates instead of simulating",
+    )
+    parser.add_argument(
+        "--antithetic",
+        action="store_true",
+        help="run iterations in antithetic pairs",
+    )
+    parser.add_argument(
+        "--crn",
+        action="store_true",
+        help="use common random numbers across parameter values",
+    )
+    parser.add_argument(
+        "--fast", action="store_true", help="use the vectorized engine if there is one"
+    )
+    parser.add_argument(
+        "--batch", type=int, default=10, help="iterations per batch with --target"
+    )
     parser.add_argument("--figure", nargs="+", help="figure file(s)")
+    parser.add_argument(
+        "--hybrid",
+        action="store_true",
+        help="show closed-form estimates where valid and simulate the rest",
+    )
     parser.add_argument("--json", action="store_true", help="show result as JSON")
+    parser.add_argument(
+        "--no-cache", action="store_true", help="ignore and don't save cached results"
+    )
+    parser.add_argument(
+        "--max-iter", type=int, default=1000, help="most iterations with --target"
+    )
     parser.add_argument("--params", action="store_true", help="explain parameters")
+    parser.add_argument(
+        "--precision",
+        type=float,
+        default=0.05,
+        help="relative half-width of the 95%% confidence interval with --target",
+    )
+    parser.add_argument(
+        "--scheduler",
+        choices=sorted(SCHEDULERS),
+        help="event list for SimPy runs (default heap)",
+    )
+    parser.add_argument("--sink", help="stream results to this directory")
     parser.add_argument("--tables", action="store_true", help="show result as tables")
+    parser.add_argument(
+        "--target",
+        choices=sorted(stopping.METRICS),
+        help="run iterations until this metric's mean is precise enough",
+    )
+    parser.add_argument(
+        "--threads", action="store_true", help="run workers as threads, not processes"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, help="number of worker processes"
+    )
     args, overrides = parser.parse_known_args()
 
     params = params_cls()
@@ -199,5 +679,9 @@ def _parse_args(params_cls):
             options[key] = [float(v) for v in values]
         else:
             options[key] = values
+        # Identical scenarios would get the same seed: use n_iter to repeat.
+        assert len(set(options[key])) == len(options[key]), (
+            f"repeated value(s) for parameter key {key}"
+        )
 
     return args, params, options
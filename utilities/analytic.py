@@ -0,0 +1,330 @@
+"""Closed-form queueing estimates to use instead of simulation."""
+
+import math
+from itertools import pairwise
+from types import SimpleNamespace
+
+import numpy as np
+import polars as pl
+
+# Job states in the rework scenarios, as `rework_same` records them.
+REWORK_STATES = [
+    "waiting_code",
+    "coding",
+    "test_queue",
+    "testing",
+    "waiting_rework",
+    "complete",
+]
+WAITING_STATES = {"waiting_code", "test_queue", "waiting_rework"}
+
+
+def mgc(params, n_server=1):
+    """Steady-state estimates for Poisson arrivals and lognormal jobs.
+
+    Jobs arrive every `t_job_interval` on average and take lognormal times
+    with parameters `t_job_mean` and `t_job_std`. With one server this is
+    the Pollaczek-Khinchine formula for M/G/1, which is exact. With more
+    it is the Allen-Cunneen approximation for M/G/c, which scales the
+    Erlang-C wait for M/M/c by the variability of job durations. Returns
+    None if the load is too high for the queue to be stable.
+    """
+    rate, mean, cv2 = _moments(
+        params.t_job_interval, params.t_job_mean, params.t_job_std
+    )
+    load = rate * mean / n_server
+    if load >= 1:
+        return None
+    wait = mean_wait(rate, mean, cv2, n_server)
+    return {
+        "load": load,
+        "mean_wait": wait,
+        "mean_length": rate * wait,
+        "mean_time": wait + mean,
+        "throughput": rate,
+        "utilization": load,
+    }
+
+
+def mean_wait(rate, mean, cv2, n_server=1):
+    """Allen-Cunneen mean wait in queue for M/G/c (exact for M/G/1)."""
+    load = rate * mean / n_server
+    if load >= 1:
+        return math.inf
+    wait = erlang_c(n_server, rate * mean) * mean / (n_server * (1 - load))
+    return wait * (1 + cv2) / 2
+
+
+def open_network(arrival, stations, routing):
+    """Solve an open network of M/G/c stations one station at a time.
+
+    `arrival` maps station names to external arrival rates, `stations`
+    maps them to (servers, mean duration, squared coefficient of variation
+    of duration), and `routing[a][b]` is the chance that a job leaving `a`
+    goes to `b` next. The traffic equations are solved for each station's
+    total arrival rate; as in a Jackson network, each station is then
+    treated as if its arrivals were Poisson. Returns one row per station.
+    """
+    names = list(stations)
+    moves = np.array([[routing.get(a, {}).get(b, 0.0) for b in names] for a in names])
+    external = np.array([arrival.get(name, 0.0) for name in names])
+    rates = np.linalg.solve(np.eye(len(names)) - moves.T, external)
+    rows = []
+    for name, rate in zip(names, rates.tolist()):
+        n_server, mean, cv2 = stations[name]
+        wait = mean_wait(rate, mean, cv2, n_server)
+        rows.append(
+            {
+                "name": name,
+                "arrival_rate": rate,
+                "visits": rate / external.sum(),
+                "utilization": rate * mean / n_server,
+                "mean_wait": wait,
+                "mean_length": rate * wait,
+            }
+        )
+    return rows
+
+
+def rework_transitions(p_rework):
+    """(state, next state, probability) for a job in the rework scenarios."""
+    return [
+        ("waiting_code", "coding", 1.0),
+        ("coding", "test_queue", 1.0),
+        ("test_queue", "testing", 1.0),
+        ("testing", "waiting_rework", p_rework),
+        ("testing", "complete", 1 - p_rework),
+        ("waiting_rework", "coding", 1.0),
+    ]
+
+
+def rework(params):
+    """Estimates for coders and testers with rework, or None if unstable.
+
+    Each job is coded and tested, then goes back for rework with chance
+    `p_rework`. Returns "stations" rows from `open_network`, "states" rows
+    with the expected visits to and time in each job state (from the
+    fundamental matrix of the job's Markov chain, whose transition matrix
+    is the one `make_state_graph.py` estimates), and a "summary" row like
+    the one from `mgc`. A job's duration is the same for every visit, so
+    the stations aren't independent and the waits are approximate.
+    """
+    rate, mean, cv2 = _moments(
+        params.t_job_interval, params.t_job_mean, params.t_job_std
+    )
+    stations = open_network(
+        {"code": rate},
+        {
+            "code": (params.n_coder, mean, cv2),
+            "test": (params.n_tester, mean, cv2),
+        },
+        {"code": {"test": 1.0}, "test": {"code": params.p_rework}},
+    )
+    if any(station["utilization"] >= 1 for station in stations):
+        return None
+
+    code, test = stations
+    holding = {
+        "waiting_code": code["mean_wait"],
+        "coding": mean,
+        "test_queue": test["mean_wait"],
+        "testing": mean,
+        "waiting_rework": code["mean_wait"],
+    }
+    transient = REWORK_STATES[:-1]
+    index = {state: i for i, state in enumerate(transient)}
+    moves = np.zeros((len(transient), len(transient)))
+    for state, after, probability in rework_transitions(params.p_rework):
+        if after in index:
+            moves[index[state], index[after]] = probability
+    visits = np.linalg.inv(np.eye(len(transient)) - moves)[index["waiting_code"]]
+    states = [
+        {
+            "state": state,
+            "visits": v,
+            "mean_time": holding[state],
+            "total_time": v * holding[state],
+        }
+        for state, v in zip(transient, visits.tolist())
+    ]
+
+    wait = sum(s["total_time"] for s in states if s["state"] in WAITING_STATES)
+    return {
+        "stations": stations,
+        "states": states,
+        "summary": {
+            "load": max(code["utilization"], test["utilization"]),
+            "mean_wait": wait,
+            "mean_length": rate * wait,
+            "mean_time": sum(s["total_time"] for s in states),
+            "throughput": rate,
+            "utilization": code["utilization"],
+        },
+    }
+
+
+def measure_rework(result):
+    """Measured counterparts of the rows from `rework` for one simulation.
+
+    Works with the "events" that `rework_same` records or the "jobs" that
+    `rework_any` records. Only completed jobs are used for visits and
+    times; `rework_any` doesn't record waits, so those are None there.
+    """
+    params = result["params"]
+    t_sim = params["t_sim"]
+    if "events" in result:
+        # Workers' own work totals aren't kept, so use time spent in states.
+        jobs, busy = _jobs_from_events(result["events"], t_sim)
+        utilization = {
+            "code": busy["coding"] / (params["n_coder"] * t_sim),
+            "test": busy["testing"] / (params["n_tester"] * t_sim),
+        }
+    else:
+        jobs = [
+            {
+                "visits": sum(event["name"] == "code" for event in job["t_start"]),
+                "time": job["t_complete"] - job["t_create"],
+                "wait": None,
+            }
+            for job in result["jobs"]
+            if job["t_complete"] is not None
+        ]
+        utilization = {
+            name: sum(w["t_work"] for w in result[table]) / (len(result[table]) * t_sim)
+            for name, table in (("code", "coders"), ("test", "testers"))
+        }
+    visits = _mean([job["visits"] for job in jobs])
+    waits = [job["wait"] for job in jobs if job["wait"] is not None]
+    return {
+        "stations": [
+            {"name": name, "visits": visits, "utilization": utilization[name]}
+            for name in ("code", "test")
+        ],
+        "summary": {
+            "load": None,
+            "mean_wait": _mean(waits),
+            "mean_length": sum(waits) / t_sim if waits else None,
+            "mean_time": _mean([job["time"] for job in jobs]),
+            "throughput": len(jobs) / t_sim,
+            "utilization": utilization["code"],
+        },
+    }
+
+
+def compare_rework(results):
+    """Frames of estimates from `rework` beside measurements from simulation."""
+    stations, summaries = [], []
+    for i, result in enumerate(results):
+        model = rework(SimpleNamespace(**result["params"]))
+        measured = measure_rework(result)
+        for method, estimates in (("model", model), ("simulation", measured)):
+            if estimates is None:
+                continue
+            for row in estimates["stations"]:
+                stations.append(
+                    {
+                        "iter": i,
+                        "method": method,
+                        "name": row["name"],
+                        "visits": row["visits"],
+                        "utilization": row["utilization"],
+                    }
+                )
+            summaries.append({"iter": i, "method": method, **estimates["summary"]})
+    return {
+        "stations": pl.DataFrame(stations).sort("iter", "name", "method"),
+        "summary": pl.DataFrame(summaries).sort("iter", "method"),
+    }
+
+
+def _jobs_from_events(events, t_sim):
+    """Visits, time in system and total wait for each completed job.
+
+    Also returns the total time all jobs spent being coded and tested.
+    """
+    history = {}
+    for event in events:
+        history.setdefault(event["id"], []).append(event)
+    jobs = []
+    busy = {"coding": 0.0, "testing": 0.0}
+    for steps in history.values():
+        steps.sort(key=lambda e: e["time"])
+        ends = [step["time"] for step in steps[1:]] + [t_sim]
+        for step, end in zip(steps, ends):
+            if step["state"] in busy:
+                busy[step["state"]] += end - step["time"]
+        if steps[-1]["state"] != "complete":
+            continue
+        wait = sum(
+            after["time"] - before["time"]
+            for before, after in pairwise(steps)
+            if before["state"] in WAITING_STATES
+        )
+        jobs.append(
+            {
+                "visits": sum(step["state"] == "coding" for step in steps),
+                "time": steps[-1]["time"] - steps[0]["time"],
+                "wait": wait,
+            }
+        )
+    return jobs, busy
+
+
+def erlang_c(n_server, offered):
+    """Probability that a job has to wait in M/M/c with `offered` = rate * mean."""
+    # Build the Erlang-B blocking probability up one server at a time.
+    blocking = 1.0
+    for c in range(1, n_server + 1):
+        blocking = offered * blocking / (c + offered * blocking)
+    load = offered / n_server
+    return blocking / (1 - load * (1 - blocking))
+
+
+def summarize(result):
+    """The same estimates as `mgc` measured from one simulation's result.
+
+    Needs "jobs" with columns of times and "coders" with work done. Runs
+    stopped early as unstable are measured up to when they stopped.
+    """
+    params = result["params"]
+    rate, mean, _ = _moments(
+        params["t_job_interval"], params["t_job_mean"], params["t_job_std"]
+    )
+    t_sim = params["t_sim"]
+    if "stability" in result:
+        t_sim = result["stability"][0]["t_stop"]
+    jobs = result["jobs"]
+    waits, times, queued = [], [], 0.0
+    for created, started, finished in zip(
+        jobs["t_create"], jobs["t_start"], jobs["t_complete"]
+    ):
+        if started is None:
+            queued += t_sim - created
+            continue
+        waits.append(started - created)
+        queued += started - created
+        if finished is not None:
+            times.append(finished - created)
+    n_server = len(result["coders"])
+    work = sum(coder["t_work"] for coder in result["coders"])
+    return {
+        "load": rate * mean / n_server,
+        "mean_wait": _mean(waits),
+        "mean_length": queued / t_sim,
+        "mean_time": _mean(times),
+        "throughput": len(times) / t_sim,
+        "utilization": work / (n_server * t_sim),
+    }
+
+
+def _mean(values):
+    return sum(values) / len(values) if values else None
+
+
+def _moments(t_job_interval, t_job_mean, t_job_std):
+    """Arrival rate, mean job duration and its squared coefficient of variation."""
+    return (
+        1 / t_job_interval,
+        math.exp(t_job_mean + t_job_std**2 / 2),
+        math.exp(t_job_std**2) - 1,
+    )
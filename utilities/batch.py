@@ -0,0 +1,113 @@
+"""Confidence intervals from one long run using non-overlapping batch means."""
+
+import math
+
+import numpy as np
+import polars as pl
+
+from utilities import stopping
+
+MIN_BATCHES = 10
+N_WINDOWS = 1024
+
+
+def batch_means(values, confidence=stopping.CONFIDENCE, min_batches=MIN_BATCHES):
+    """Mean, confidence half-width, batch size and number of batches.
+
+    The batch size starts at one value and doubles until the lag-1
+    autocorrelation of the batch means is no longer significant, or until
+    another doubling would leave fewer than `min_batches` batches. Values
+    left over are dropped from the start of the series, which is the part
+    most likely to be affected by warm-up.
+    """
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    if n < min_batches:
+        return float(values.mean()) if n else math.nan, math.inf, n, 1
+    size = 1
+    while True:
+        means = _means(values, size)
+        if 2 * size * min_batches > n or _lag1(means) <= 2 / math.sqrt(len(means)):
+            break
+        size *= 2
+    half = stopping.half_width(means.tolist(), confidence)
+    return float(means.mean()), half, size, len(means)
+
+
+def df_batch_means(df, col_time, col_value, group_col="iter"):
+    """Batch-means estimate of the mean of `col_value` for each group.
+
+    Rows are put in order of `col_time` within each group, so this works
+    for job delays ordered by creation as well as for monitor samples.
+    """
+    rows = []
+    for part in df.sort(col_time).partition_by(group_col, maintain_order=True):
+        values = part[col_value].drop_nulls().to_numpy()
+        rows.append(_row(part, group_col, col_value, batch_means(values)))
+    return pl.DataFrame(rows).sort(group_col)
+
+
+def df_batch_throughput(jobs, group_col="iter", n_windows=N_WINDOWS):
+    """Throughput with a batch-means confidence interval for each group.
+
+    Completions are counted in `n_windows` equal windows of the run and
+    the rates in those windows are treated as a series.
+    """
+    rows = []
+    for part in jobs.partition_by(group_col, maintain_order=True):
+        edges = np.linspace(0, part["t_sim"][0], n_windows + 1)
+        completed = part["t_complete"].drop_nulls().to_numpy()
+        counts, _ = np.histogram(completed, bins=edges)
+        rates = counts / np.diff(edges)
+        rows.append(_row(part, group_col, "throughput", batch_means(rates)))
+    return pl.DataFrame(rows).sort(group_col)
+
+
+def df_batch_utilization(jobs, n_server=1, group_col="iter", n_windows=N_WINDOWS):
+    """Utilization of `n_server` servers with a batch-means confidence interval.
+
+    Busy time in each window comes from the jobs' start and completion
+    times, with jobs still running at the end busy until `t_sim`.
+    """
+    rows = []
+    for part in jobs.partition_by(group_col, maintain_order=True):
+        t_sim = part["t_sim"][0]
+        edges = np.linspace(0, t_sim, n_windows + 1)
+        started = part.filter(pl.col("t_start").is_not_null())
+        start = np.sort(started["t_start"].to_numpy())
+        end = np.sort(started["t_complete"].fill_null(t_sim).to_numpy())
+        busy = np.diff(_busy_until(start, edges) - _busy_until(end, edges))
+        fraction = busy / (n_server * np.diff(edges))
+        rows.append(_row(part, group_col, "utilization", batch_means(fraction)))
+    return pl.DataFrame(rows).sort(group_col)
+
+
+def _busy_until(times, edges):
+    """Sum over sorted `times` of max(0, edge - time) for each edge."""
+    before = np.searchsorted(times, edges, side="right")
+    totals = np.concatenate(([0.0], np.cumsum(times)))
+    return before * edges - totals[before]
+
+
+def _lag1(means):
+    centred = means - means.mean()
+    denominator = (centred * centred).sum()
+    if denominator == 0:
+        return 0.0
+    return float((centred[1:] * centred[:-1]).sum() / denominator)
+
+
+def _means(values, size):
+    n = len(values) // size
+    return values[len(values) - n * size :].reshape(n, size).mean(axis=1)
+
+
+def _row(part, group_col, name, estimate):
+    mean, half, size, count = estimate
+    return {
+        **part.select(group_col).row(0, named=True),
+        name: mean,
+        "half_width": half,
+        "batch_size": size,
+        "n_batches": count,
+    }
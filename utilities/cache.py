@@ -0,0 +1,97 @@
+"""On-disk cache of scenario results."""
+
+import ast
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+
+CACHE_DIR = Path(os.getenv("SIM_CACHE_DIR", Path.home() / ".cache" / "sim"))
+CACHE_SIZE = 2**30
+
+
+class ResultCache:
+    """Content-addressed store of simulation results with LRU eviction."""
+
+    def __init__(self, simulation_cls, root=CACHE_DIR, max_bytes=CACHE_SIZE):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.source = _source_digest(simulation_cls)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def key(self, params, seed):
+        """Key for a simulation with these parameters and seed."""
+        text = json.dumps([self.source, params, seed], sort_keys=True)
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def has(self, key):
+        """Is there an entry for this key?"""
+        return self._path(key).exists()
+
+    def get(self, key):
+        """Cached result or None, marking the entry as recently used."""
+        path = self._path(key)
+        try:
+            result = json.loads(path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        path.touch()
+        return result
+
+    def put(self, key, result):
+        """Save a result, replacing the entry atomically."""
+        path = self._path(key)
+        temp = path.with_suffix(f".{os.getpid()}.tmp")
+        temp.write_text(json.dumps(result))
+        os.replace(temp, path)
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits."""
+        entries = []
+        for path in self.root.glob("*.json"):
+            stat = path.stat()
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def _path(self, key):
+        return self.root / f"{key}.json"
+
+
+def _source_digest(simulation_cls):
+    """Hash the code a simulation depends on, ignoring `__main__` blocks.
+
+    This covers every loaded module from the simulation's own directory
+    plus the utilities package, so editing plotting code in a script's
+    main block doesn't invalidate its results.
+    """
+    home = Path(sys.modules[simulation_cls.__module__].__file__).resolve().parent
+    utilities = Path(__file__).resolve().parent
+    paths = set()
+    for module in list(sys.modules.values()):
+        filename = getattr(module, "__file__", None)
+        if filename is None:
+            continue
+        path = Path(filename).resolve()
+        if path.suffix == ".py" and path.parent in (home, utilities):
+            paths.add(path)
+
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        tree = ast.parse(path.read_text())
+        tree.body = [node for node in tree.body if not _is_main_block(node)]
+        digest.update(path.name.encode())
+        digest.update(ast.dump(tree).encode())
+    return digest.hexdigest()
+
+
+def _is_main_block(node):
+    return isinstance(node, ast.If) and ast.unparse(node.test) in (
+        "__name__ == '__main__'",
+        "'__main__' == __name__",
+    )
@@ -0,0 +1,338 @@
+"""Vectorized engines for queueing scenarios simple enough not to need SimPy."""
+
+import numpy as np
+
+import utilities
+from utilities.streams import BLOCK, Streams
+
+
+def lindley(params, seeds, tables):
+    """Simulate single-server FIFO scenarios with the Lindley recursion.
+
+    `params` is a list of parameter objects that differ only in iteration
+    and `seeds` gives each one's seed. Jobs arrive with exponential gaps
+    of mean `t_job_interval` starting at time 0 and take lognormal times
+    with parameters `t_job_mean` and `t_job_std` until `t_sim`. Every
+    scenario is a row of the same 2-D arrays. Each result has the same
+    shape as the SimPy version but only has the named tables (any of
+    "jobs", "coders", "lengths", "ages" and "queues").
+    """
+
+    first = params[0]
+    arrival, duration = _draw_jobs(first, seeds)
+
+    # A job starts when it arrives or when the one before it finishes,
+    # whichever is later. If P is the total duration of earlier jobs, that
+    # is P plus the largest value of arrival - P up to and including it.
+    before = np.cumsum(duration, axis=1) - duration
+    start = before + np.maximum.accumulate(arrival - before, axis=1)
+    server = np.zeros(start.shape, dtype=int)
+
+    return [
+        _single_stage(first, row, tables, 1)
+        for row in _rows(first.t_sim, arrival, duration, start, server)
+    ]
+
+
+def multi_server(params, seeds, tables):
+    """Simulate scenarios with `n_coder` coders sharing one FIFO queue.
+
+    Takes the same arguments and makes the same tables as `lindley`, but
+    each job goes to whichever coder is free first.
+    """
+
+    first = params[0]
+    arrival, duration = _draw_jobs(first, seeds)
+    start, server = _serve(arrival, duration, first.n_coder)
+    return [
+        _single_stage(first, row, tables, first.n_coder)
+        for row in _rows(first.t_sim, arrival, duration, start, server)
+    ]
+
+
+def tandem(params, seeds, tables):
+    """Simulate `n_coder` coders feeding `n_tester` testers with no rework.
+
+    Each job is coded, waits in a FIFO test queue in the order coding
+    finishes, and is then tested for the same length of time. Tables are
+    any of "jobs", "lengths", "ages", "queues", "coders" and "testers";
+    the queue tables have a `name` column as in the SimPy version.
+    """
+
+    first = params[0]
+    t_sim, t_monitor = first.t_sim, getattr(first, "t_monitor", None)
+    arrival, duration = _draw_jobs(first, seeds)
+    code_start, coder = _serve(arrival, duration, first.n_coder)
+    code_end = code_start + duration
+
+    order = np.argsort(code_end, axis=1, kind="stable")
+    test_arrival = np.take_along_axis(code_end, order, axis=1)
+    test_create = np.take_along_axis(arrival, order, axis=1)
+    test_duration = np.take_along_axis(duration, order, axis=1)
+    test_start, tester = _serve(test_arrival, test_duration, first.n_tester)
+
+    # Put test results back in order of creation.
+    unsort = np.argsort(order, axis=1)
+    test_start = np.take_along_axis(test_start, unsort, axis=1)
+    tester = np.take_along_axis(tester, unsort, axis=1)
+    test_end = test_start + duration
+
+    results = []
+    for i, row in enumerate(_rows(t_sim, arrival, duration, code_start, coder)):
+        waiting = test_arrival[i] < t_sim
+        tested = np.sort(test_start[i][code_end[i] < t_sim])
+        queues = {
+            "code": row.queue,
+            "test": _Queue(
+                t_sim,
+                test_arrival[i][waiting],
+                tested[tested < t_sim],
+                test_create[i][waiting],
+            ),
+        }
+        result = {}
+        for name in tables:
+            if name == "jobs":
+                result[name] = _tandem_jobs(
+                    t_sim,
+                    row.t_create,
+                    row.t_start,
+                    test_start[i][row.created],
+                    test_end[i][row.created],
+                )
+            elif name in ("lengths", "ages"):
+                result[name] = [
+                    r
+                    for label, queue in queues.items()
+                    for r in queue.rows(name, t_monitor, name=label)
+                ]
+            elif name == "queues":
+                result[name] = [q.stats(name=label) for label, q in queues.items()]
+            elif name == "coders":
+                result[name] = _work(
+                    t_sim, code_end[i], duration[i], coder[i], first.n_coder
+                )
+            elif name == "testers":
+                result[name] = _work(
+                    t_sim, test_end[i], duration[i], tester[i], first.n_tester
+                )
+            else:
+                assert False, f"unknown table {name}"
+        results.append(result)
+    return results
+
+
+def _draw_jobs(params, seeds):
+    """Arrival times and durations with one row per seed.
+
+    Gaps and durations come from each seed's "job_arrival" and
+    "job_duration" streams as standard variates in blocks of the same size
+    `Streams` uses, and are then scaled. A scenario's jobs therefore don't
+    depend on `t_sim`, and runs with common random numbers see the same
+    jobs when they differ in `t_job_interval` or in the other parameters.
+    Blocks are drawn until every row has run past `t_sim`.
+    """
+
+    arrivals = [Streams(seed).generator("job_arrival") for seed in seeds]
+    durations = [Streams(seed).generator("job_duration") for seed in seeds]
+    gaps, normals = [], []
+    while True:
+        gaps.append(np.array([g.standard_exponential(BLOCK) for g in arrivals]))
+        normals.append(np.array([g.standard_normal(BLOCK) for g in durations]))
+        gap = np.concatenate(gaps, axis=1) / (1.0 / params.t_job_interval)
+        arrival = np.cumsum(gap, axis=1) - gap
+        if (arrival[:, -1] >= params.t_sim).all():
+            normal = np.concatenate(normals, axis=1)
+            return arrival, np.exp(params.t_job_mean + params.t_job_std * normal)
+
+
+def _serve(arrival, duration, n_server):
+    """Start times and servers for jobs taken in order from a FIFO queue.
+
+    Each job goes to the server that becomes free first. Rather than a
+    heap per scenario this keeps a row of free times per scenario and
+    takes the smallest in every row at once, which is as cheap as a heap
+    for the numbers of servers we use and needs no Python loop over rows.
+    """
+
+    rows, n_jobs = arrival.shape
+    free = np.zeros((rows, n_server))
+    start = np.empty_like(arrival)
+    server = np.empty(arrival.shape, dtype=int)
+    everyone = np.arange(rows)
+    for j in range(n_jobs):
+        chosen = free.argmin(axis=1)
+        start[:, j] = np.maximum(arrival[:, j], free[everyone, chosen])
+        free[everyone, chosen] = start[:, j] + duration[:, j]
+        server[:, j] = chosen
+    return start, server
+
+
+class _Row:
+    """One scenario's jobs up to `t_sim` in order of arrival."""
+
+    def __init__(self, t_sim, arrival, duration, start, server):
+        self.created = arrival < t_sim
+        self.t_create = arrival[self.created]
+        self.t_start = start[self.created]
+        self.duration = duration[self.created]
+        self.server = server[self.created]
+        self.t_complete = self.t_start + self.duration
+        self.started = self.t_start < t_sim
+        self.completed = self.t_complete < t_sim
+        self.queue = _Queue(t_sim, self.t_create, self.t_start[self.started])
+
+
+def _rows(t_sim, arrival, duration, start, server):
+    for i in range(len(arrival)):
+        yield _Row(t_sim, arrival[i], duration[i], start[i], server[i])
+
+
+def _single_stage(params, row, tables, n_server):
+    """Result tables for a scenario with one queue."""
+
+    t_monitor = getattr(params, "t_monitor", None)
+    result = {}
+    for name in tables:
+        if name == "jobs":
+            result[name] = {
+                "t_create": _export(row.t_create),
+                "t_start": _export(np.where(row.started, row.t_start, np.nan)),
+                "t_complete": _export(np.where(row.completed, row.t_complete, np.nan)),
+            }
+        elif name == "coders":
+            result[name] = _work(
+                params.t_sim, row.t_complete, row.duration, row.server, n_server
+            )
+        elif name in ("lengths", "ages"):
+            result[name] = row.queue.rows(name, t_monitor)
+        elif name == "queues":
+            result[name] = [row.queue.stats()]
+        elif name == "integration":
+            result[name] = _integration(params.t_sim, row, n_server)
+        else:
+            assert False, f"unknown table {name}"
+    return result
+
+
+def _integration(t_sim, row, n_server):
+    """Jobs of zero length that every server is given when a job completes.
+
+    This is what `cost_of_sharing` does with `t_integration=0`: each
+    server starts (and so finishes) its integration job when the job it
+    is working on is done, or straight away if it is idle. Its own queue
+    comes first, so a job it would start at that moment doesn't count.
+    Columns are as in the "jobs" table.
+    """
+
+    done = row.t_complete[row.completed]
+    created, started = [], []
+    for k in range(n_server):
+        mine = row.server == k
+        begin, end = row.t_start[mine], row.t_complete[mine]
+        start = done
+        if len(begin):
+            current = np.searchsorted(begin, done, side="left") - 1
+            busy = np.where(current >= 0, end[np.maximum(current, 0)], 0.0)
+            start = np.maximum(done, busy)
+        created.append(done)
+        started.append(start)
+    t_create = np.concatenate(created)
+    order = np.argsort(t_create, kind="stable")
+    t_start = np.concatenate(started)[order]
+    t_start = np.where(t_start < t_sim, t_start, np.nan)
+    return {
+        "t_create": _export(t_create[order]),
+        "t_start": _export(t_start),
+        "t_complete": _export(t_start),
+    }
+
+
+def _tandem_jobs(t_sim, t_create, code_start, test_start, test_end):
+    """Job rows with a list of start events, as `rework_any` saves them."""
+
+    jobs = []
+    for created, starts, end in zip(
+        t_create.tolist(),
+        zip(code_start.tolist(), test_start.tolist()),
+        test_end.tolist(),
+    ):
+        events = [
+            {"name": name, "event": "start", "time": time}
+            for name, time in zip(("code", "test"), starts)
+            if time < t_sim
+        ]
+        jobs.append(
+            {
+                "t_create": round(created, utilities.PRECISION),
+                "t_start": events,
+                "t_complete": round(end, utilities.PRECISION) if end < t_sim else None,
+            }
+        )
+    return jobs
+
+
+def _work(t_sim, t_complete, duration, server, n_server):
+    """Rows of work done by each server on jobs it finished by `t_sim`."""
+
+    done = t_complete < t_sim
+    work = np.bincount(server[done], weights=duration[done], minlength=n_server)
+    return [{"t_work": round(w, utilities.PRECISION)} for w in work.tolist()]
+
+
+class _Queue:
+    """Statistics for a FIFO queue from sorted arrival and start times.
+
+    `t_start` only has the jobs that started by `t_sim`, which are the
+    first ones to arrive. Ages are measured from `t_create` (in order of
+    arrival) if it is given, or from arrival if not.
+    """
+
+    def __init__(self, t_sim, t_arrive, t_start, t_create=None):
+        self.t_sim = t_sim
+        self.t_arrive = t_arrive
+        self.t_start = t_start
+        self.t_create = t_arrive if t_create is None else t_create
+
+    def rows(self, table, interval, **labels):
+        """Rows of the "lengths" or "ages" table every `interval` before `t_sim`."""
+
+        if not interval:
+            return []
+        times = interval * np.arange(int(np.ceil(self.t_sim / interval)))
+        times = times[times < self.t_sim]
+        arrived = np.searchsorted(self.t_arrive, times, side="right")
+        begun = np.searchsorted(self.t_start, times, side="right")
+        lengths = arrived - begun
+        if table == "lengths":
+            return [
+                {"time": t, **labels, "length": n}
+                for t, n in zip(times.tolist(), lengths.tolist())
+            ]
+        totals = np.concatenate(([0.0], np.cumsum(self.t_create)))
+        waiting = totals[arrived] - totals[begun]
+        ages = np.where(lengths > 0, times - waiting / np.maximum(lengths, 1), 0)
+        return [
+            {"time": t, **labels, "mean_age": a}
+            for t, a in zip(times.tolist(), ages.tolist())
+        ]
+
+    def stats(self, **labels):
+        """Time-weighted mean and maximum length, as in `queue_stats`."""
+
+        ends = np.full(len(self.t_arrive), float(self.t_sim))
+        ends[: len(self.t_start)] = self.t_start
+        begun = np.searchsorted(self.t_start, self.t_arrive, side="right")
+        lengths = np.arange(1, len(self.t_arrive) + 1) - begun
+        return {
+            **labels,
+            "mean_length": float((ends - self.t_arrive).sum() / self.t_sim),
+            "max_length": int(lengths.max(initial=0)),
+        }
+
+
+def _export(values):
+    """Rounded values as a list with None instead of NaN."""
+
+    rounded = np.round(values, utilities.PRECISION)
+    return np.where(np.isnan(rounded), None, rounded).tolist()
@@ -0,0 +1,95 @@
+"""Build dataframes from scenario results."""
+
+from itertools import chain, repeat
+
+import polars as pl
+
+_DTYPES = {
+    frozenset(): pl.Null,
+    frozenset({bool}): pl.Boolean,
+    frozenset({int}): pl.Int64,
+    frozenset({float}): pl.Float64,
+    frozenset({int, float}): pl.Float64,
+    frozenset({str}): pl.String,
+}
+
+
+class FrameBuilder:
+    """Accumulate results column by column and create each frame once.
+
+    Values are gathered into one list per column across all scenarios,
+    so there is one schema decision and one frame construction per table
+    rather than one per scenario. The `iter` and parameter columns are
+    broadcast from a one-row-per-scenario table at the end.
+    """
+
+    def __init__(self):
+        self.params = []
+        self.tables = {}
+
+    def append(self, result):
+        owner = len(self.params)
+        self.params.append(result["params"])
+        for name, rows in result.items():
+            if name == "params":
+                continue
+            if name not in self.tables:
+                self.tables[name] = _Table()
+            self.tables[name].add(rows, owner)
+
+    def build(self):
+        scenarios = pl.DataFrame(
+            {
+                "iter": range(len(self.params)),
+                **{key: [p[key] for p in self.params] for key in self._param_keys()},
+            }
+        )
+        return {name: table.build(scenarios) for name, table in self.tables.items()}
+
+    def _param_keys(self):
+        return dict.fromkeys(chain.from_iterable(self.params))
+
+
+class _Table:
+    """Column buffers for one kind of record."""
+
+    def __init__(self):
+        self.columns = {}
+        self.owners = []
+
+    def add(self, rows, owner):
+        """Add a list of row dictionaries or a dictionary of columns."""
+        if isinstance(rows, dict):
+            columns = rows
+            count = len(next(iter(columns.values()), []))
+        else:
+            keys = dict.fromkeys(chain.from_iterable(rows))
+            columns = {key: map(dict.get, rows, repeat(key)) for key in keys}
+            count = len(rows)
+
+        length = len(self.owners)
+        for key, values in columns.items():
+            if key not in self.columns:
+                self.columns[key] = [None] * length
+            self.columns[key].extend(values)
+
+        self.owners.extend(repeat(owner, count))
+        for column in self.columns.values():
+            if len(column) < len(self.owners):
+                column.extend(repeat(None, len(self.owners) - len(column)))
+
+    def build(self, scenarios):
+        data = pl.DataFrame(
+            [
+                pl.Series(key, values, dtype=_dtype(values), strict=False)
+                for key, values in self.columns.items()
+            ],
+            height=len(self.owners),
+        )
+        broadcast = scenarios.select(pl.all().gather(self.owners))
+        return pl.concat([data, broadcast], how="horizontal")
+
+
+def _dtype(values):
+    """Column type from the Python types present, or None to let Polars infer."""
+    return _DTYPES.get(frozenset(map(type, values)) - {type(None)})
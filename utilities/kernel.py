@@ -0,0 +1,115 @@
+"""A SimPy environment whose plain delays don't create events."""
+
+from types import MethodType, SimpleNamespace
+
+from simpy import Environment
+from simpy.core import NORMAL, EmptySchedule, EventPriority, Infinity, StopSimulation
+from simpy.events import Timeout
+
+from utilities.schedulers import SCHEDULERS
+
+# What a process resumed after a lean delay is sent, as if by a Timeout.
+_RESUMED = SimpleNamespace(_ok=True, _value=None)
+
+
+class LeanEnvironment(Environment):
+    """Environment that schedules processes instead of timeouts for delays.
+
+    `timeout(delay)` returns the same `Delay` every time. When a process
+    yields it, the process's resume method goes straight onto the event
+    list as (time, priority, id, resume), and `step` calls it, so there
+    is no `Timeout` and no list of callbacks for each delay. Processes
+    resume in the same order as they would after ordinary timeouts, and
+    can still be interrupted while waiting. Timeouts with a value are
+    ordinary ones. A lean timeout must be yielded as soon as it is made,
+    as in `yield self.timeout(t)`, and can't be combined with other events.
+
+    The event list is one of the `SCHEDULERS`, a binary heap by default.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.delay = Delay(self)
+        self.use_scheduler("heap")
+
+    def use_scheduler(self, name):
+        """Keep events in the named scheduler (before anything is scheduled)."""
+        assert name in SCHEDULERS, f"unknown scheduler {name}"
+        assert not self._queue, "can't change scheduler with events pending"
+        self._queue = SCHEDULERS[name]()
+        self._push = self._queue.push
+        self._pop = self._queue.pop
+
+    def timeout(self, delay, value=None):
+        """A delay for the active process to yield."""
+        if value is not None:
+            return Timeout(self, delay, value)
+        if delay < 0:
+            raise ValueError(f"Negative delay {delay}")
+        self.delay.length = delay
+        return self.delay
+
+    def schedule(self, event, priority=NORMAL, delay=0):
+        self._push((self._now + delay, priority, next(self._eid), event))
+
+    def peek(self):
+        entry = self._queue.first()
+        return Infinity if entry is None else entry[0]
+
+    def step(self):
+        try:
+            when, _, eid, event = self._pop()
+        except IndexError:
+            raise EmptySchedule from None
+
+        if type(event) is MethodType:
+            delay = self.delay
+            cancelled = delay.cancelled
+            if cancelled and eid in cancelled:
+                cancelled.remove(eid)
+                return
+            del delay.waiting[event.__self__]
+            self._now = when
+            event(_RESUMED)
+            return
+
+        # The rest is as in Environment.step.
+        self._now = when
+        callbacks, event.callbacks = event.callbacks, None
+        try:
+            for callback in callbacks:
+                callback(event)
+        except StopSimulation:
+            event.callbacks = callbacks[callbacks.index(callback) + 1 :]
+            self.schedule(event, EventPriority(-1))
+            raise
+        if not event._ok and not hasattr(event, "_defused"):
+            exc = type(event._value)(*event._value.args)
+            exc.__cause__ = event._value
+            raise exc
+
+
+class Delay:
+    """Stand-in for a `Timeout` that schedules processes as they yield it.
+
+    SimPy processes wait for an event by adding their resume method to its
+    `callbacks`, and an interrupt takes it out again, so this is its own
+    `callbacks` and has `append` and `remove`. `waiting` holds the event
+    id of each process's current delay until it fires or is cancelled.
+    """
+
+    def __init__(self, env):
+        self.env = env
+        self.length = 0
+        self.callbacks = self
+        self.cancelled = set()
+        self.waiting = {}
+
+    def append(self, resume):
+        env = self.env
+        eid = next(env._eid)
+        self.waiting[resume.__self__] = eid
+        env._push((env._now + self.length, NORMAL, eid, resume))
+
+    def remove(self, resume):
+        self.cancelled.add(self.waiting.pop(resume.__self__))
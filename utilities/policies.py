@@ -0,0 +1,48 @@
+"""Orders in which priority stores hand out jobs."""
+
+POLICIES = {}
+
+
+def policy(name):
+    """Register a function from a job to its sort key under `name`.
+
+    Keys are tuples compared element by element, smallest first. Jobs with
+    equal keys come out in the order they were put in.
+    """
+
+    def register(func):
+        POLICIES[name] = func
+        return func
+
+    return register
+
+
+@policy("oldest")
+def oldest(job):
+    return (job.t_create,)
+
+
+@policy("newest")
+def newest(job):
+    return (-job.t_create,)
+
+
+@policy("shortest")
+def shortest(job):
+    return (job.duration,)
+
+
+@policy("longest")
+def longest(job):
+    return (-job.duration,)
+
+
+@policy("priority")
+def priority(job):
+    return (job.priority, job.t_create)
+
+
+def sort_key(name):
+    """The key function registered as `name`."""
+    assert name in POLICIES, f"unknown policy {name}"
+    return POLICIES[name]
@@ -0,0 +1,135 @@
+"""Event lists for `LeanEnvironment`.
+
+Each holds SimPy's (time, priority, id, event) entries and has `push`,
+`pop` (raising IndexError when empty), `first` (None when empty) and
+`len`. Entries come out in the same order from all of them, so the
+choice changes how long a run takes but not its results.
+"""
+
+from bisect import insort
+from functools import partial
+from heapq import heappop, heappush
+from itertools import pairwise
+
+MAX_DAYS = 4
+MIN_BUCKETS = 2
+N_SAMPLE = 25
+
+
+class HeapQueue:
+    """SimPy's own binary heap: O(log n) to add or remove an entry."""
+
+    def __init__(self):
+        self.entries = []
+        # Bind heapq's functions to the list so that calls stay in C.
+        self.push = partial(heappush, self.entries)
+        self.pop = partial(heappop, self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def first(self):
+        """The next entry without removing it."""
+        return self.entries[0] if self.entries else None
+
+
+class CalendarQueue:
+    """Brown's calendar queue: O(1) amortized to add or remove an entry.
+
+    Entries are kept in a ring of buckets, each a sorted list for one
+    "day" of length `width`. An entry goes in the bucket for its day
+    modulo the number of buckets, and the next one is found by walking
+    forward a day at a time from the time of the last one removed. The
+    number of buckets doubles or halves to stay close to the number of
+    entries, and the width is then set to three times the mean gap
+    between the next few entries so that most days hold one or two. The
+    width is also re-estimated if removals start walking through more
+    than `MAX_DAYS` days each on average, since the spacing of entries
+    can change while their number doesn't.
+    """
+
+    def __init__(self):
+        self.buckets = [[] for _ in range(MIN_BUCKETS)]
+        self.width = 1.0
+        self.size = 0
+        self.time = 0.0
+        self.pops = 0
+        self.days = 0
+
+    def __len__(self):
+        return self.size
+
+    def push(self, entry):
+        """Add an entry no earlier than the last one removed."""
+        buckets = self.buckets
+        insort(buckets[int(entry[0] / self.width) % len(buckets)], entry)
+        self.size += 1
+        if self.size > 2 * len(buckets):
+            self._resize(2 * len(buckets))
+
+    def pop(self):
+        """Remove and return the next entry."""
+        if not self.size:
+            raise IndexError("pop from empty calendar queue")
+        bucket, days = self._next()
+        entry = bucket.pop(0)
+        self.size -= 1
+        self.time = entry[0]
+        self.pops += 1
+        self.days += days
+        n = len(self.buckets)
+        if self.size < n // 2 and n > MIN_BUCKETS:
+            self._resize(n // 2)
+        elif self.pops >= n:
+            if self.days > MAX_DAYS * self.pops:
+                self._resize(n)
+            else:
+                self.pops = self.days = 0
+        return entry
+
+    def first(self):
+        """The next entry without removing it."""
+        return self._next()[0][0] if self.size else None
+
+    def _next(self):
+        """The bucket whose first entry is the next one and days walked."""
+        buckets = self.buckets
+        width = self.width
+        n = len(buckets)
+        day = int(self.time / width)
+        for days in range(n):
+            bucket = buckets[(day + days) % n]
+            if bucket and int(bucket[0][0] / width) <= day + days:
+                return bucket, days
+        # Nothing in the coming year, so look at every bucket.
+        return min((b for b in buckets if b), key=lambda b: b[0]), n
+
+    def _resize(self, n_bucket):
+        entries = sorted(entry for bucket in self.buckets for entry in bucket)
+        self.width = _width(entries, self.width)
+        self.buckets = [[] for _ in range(n_bucket)]
+        self.pops = self.days = 0
+        for entry in entries:
+            self.buckets[int(entry[0] / self.width) % n_bucket].append(entry)
+
+
+def _width(entries, default):
+    """Three times the mean gap between the first few sorted entries.
+
+    Gaps more than twice the first mean are left out of the second, as in
+    Brown's paper, so a few distant entries don't make the days too long.
+    """
+    times = [entry[0] for entry in entries[:N_SAMPLE]]
+    gaps = [b - a for a, b in pairwise(times)]
+    if not gaps:
+        return default
+    mean = sum(gaps) / len(gaps)
+    close = [gap for gap in gaps if gap <= 2 * mean]
+    width = 3 * sum(close) / len(close)
+    return width if width > 0 else default
+
+
+SCHEDULERS = {
+    "calendar": CalendarQueue,
+    "heap": HeapQueue,
+}
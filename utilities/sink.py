@@ -0,0 +1,61 @@
+"""Stream scenario results to disk as they finish."""
+
+import json
+from contextlib import ExitStack
+from pathlib import Path
+
+import polars as pl
+
+
+class Sink:
+    """Write each scenario's tables as newline-delimited JSON.
+
+    Tables may be lists of rows or dictionaries of columns. Each row gets
+    the same `iter` and parameter columns that `as_frames` adds, so the
+    files can be scanned lazily without holding every scenario in memory.
+    Files stay open until `close` is called or the `with` block ends.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.files = {}
+        self.count = 0
+        self.stack = ExitStack()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def append(self, result):
+        params = result["params"]
+        for name, rows in result.items():
+            if name == "params":
+                continue
+            if name not in self.files:
+                self.files[name] = self._open(name)
+            out = self.files[name]
+            if isinstance(rows, dict):
+                rows = [dict(zip(rows, values)) for values in zip(*rows.values())]
+            for row in rows:
+                out.write(json.dumps({**row, "iter": self.count, **params}))
+                out.write("\n")
+        self.count += 1
+
+    def close(self):
+        self.stack.close()
+
+    def scan(self):
+        """Lazy frames over everything written so far."""
+        return {
+            name: pl.scan_ndjson(self._path(name), infer_schema_length=None)
+            for name in self.files
+        }
+
+    def _open(self, name):
+        return self.stack.enter_context(open(self._path(name), "w"))
+
+    def _path(self, name):
+        return self.root / f"{name}.ndjson"
@@ -0,0 +1,59 @@
+"""Stopping scenarios whose queues grow without bound."""
+
+import math
+
+import polars as pl
+from simpy.core import StopSimulation
+
+MAX_BACKLOG = 1000
+
+
+def guard(sim, queues, max_backlog=MAX_BACKLOG):
+    """Stop `sim` as soon as any of the tally stores in `queues` is too long.
+
+    A backlog of more than `max_backlog` jobs means that work is arriving
+    faster than it can be done, so simulating on to `t_sim` only grows the
+    queue. The returned event has triggered if the simulation was stopped;
+    everything recorded up to then is kept.
+    """
+    overflow = sim.any_of([queue.watch(max_backlog) for queue in queues])
+    overflow.callbacks.append(StopSimulation.callback)
+    return overflow
+
+
+def offered_load(params, n_server=1):
+    """Mean work arriving per unit time for each server.
+
+    Jobs arrive every `t_job_interval` on average and take lognormal times
+    with parameters `t_job_mean` and `t_job_std`, so a value of 1 or more
+    means the queue can't be stable.
+    """
+    mean = math.exp(params.t_job_mean + params.t_job_std**2 / 2)
+    return mean / (n_server * params.t_job_interval)
+
+
+def stability(sim, overflow, n_server=1):
+    """One "stability" row: whether the run finished and when it stopped."""
+    return {
+        "stable": not overflow.triggered,
+        "t_stop": sim.now,
+        "load": offered_load(sim.params, n_server),
+    }
+
+
+def with_t_stop(df, runs=None):
+    """`df` with the `t_stop` and `stable` columns of each row's run.
+
+    `runs` is the "stability" table. Without one the runs weren't guarded,
+    so they all lasted `t_sim`.
+    """
+    if runs is None:
+        return df.with_columns(pl.col("t_sim").alias("t_stop"))
+    return df.join(runs.select("iter", "t_stop", "stable"), on="iter")
+
+
+def df_stable(df, runs=None):
+    """Rows of `df` from runs that weren't stopped early."""
+    if runs is None:
+        return df
+    return df.join(runs.filter("stable").select("iter"), on="iter", how="semi")
@@ -0,0 +1,85 @@
+"""Stopping rules for running replications until results are precise enough."""
+
+import math
+from statistics import fmean, stdev
+
+import polars as pl
+from scipy import stats
+
+import utilities
+
+CONFIDENCE = 0.95
+
+
+def metric_throughput(frames):
+    """Completed jobs per unit time in each iteration, up to when it stopped."""
+    completed = pl.col("t_complete").is_not_null().sum()
+    return (
+        utilities.with_t_stop(frames["jobs"], frames.get("stability"))
+        .group_by("iter")
+        .agg((completed / pl.col("t_stop").first()).alias("value"))
+    )
+
+
+def metric_delay(frames):
+    """Mean delay of started jobs in each iteration."""
+    return (
+        utilities.df_jobs(frames["jobs"])
+        .group_by("iter")
+        .agg(pl.col("delay").mean().alias("value"))
+    )
+
+
+def metric_mean_age(frames):
+    """Mean age of queued jobs at the last sample of each iteration."""
+    return (
+        frames["ages"]
+        .filter(pl.col("time") == pl.col("time").max().over("iter"))
+        .group_by("iter")
+        .agg(pl.col("mean_age").mean().alias("value"))
+    )
+
+
+METRICS = {
+    "delay": metric_delay,
+    "mean_age": metric_mean_age,
+    "throughput": metric_throughput,
+}
+
+
+def measure(target, results, pairs=False):
+    """Values of the target metric for a batch of results.
+
+    With antithetic `pairs` each value is the mean of one pair, since
+    only those are independent.
+    """
+    iters = pl.DataFrame(
+        {
+            "iter": range(len(results)),
+            "n_iter": [result["params"]["n_iter"] for result in results],
+        }
+    )
+    values = METRICS[target](utilities.as_frames(results)).join(iters, on="iter")
+    if pairs:
+        values = values.group_by(pl.col("n_iter") // 2).agg(pl.col("value").mean())
+    return values.sort("n_iter")["value"].drop_nulls().to_list()
+
+
+def half_width(values, confidence=CONFIDENCE):
+    """Half-width of the confidence interval for the mean of `values`."""
+    n = len(values)
+    if n < 2:
+        return math.inf
+    return t_quantile((1 + confidence) / 2, n - 1) * stdev(values) / math.sqrt(n)
+
+
+def precise(values, precision, confidence=CONFIDENCE):
+    """Is the interval's half-width within `precision` of the mean?"""
+    if len(values) < 2:
+        return False
+    return half_width(values, confidence) <= precision * abs(fmean(values))
+
+
+def t_quantile(p, df):
+    """Student's t quantile."""
+    return float(stats.t.ppf(p, df))
@@ -0,0 +1,343 @@
+"""Instrumented SimPy stores."""
+
+from array import array
+from bisect import bisect_right
+from heapq import heapify, heappop, heappush
+from itertools import count
+
+from simpy import Event, Store
+
+from utilities.policies import sort_key
+
+
+class Tally:
+    """Keep running statistics of a store as items come and go.
+
+    Items must have a `t_create` attribute. Because the totals are updated
+    on every put and get, the mean and variance of the ages of everything
+    in the store can be found in constant time instead of by scanning it.
+    The store also keeps its time-weighted mean and maximum length and a
+    log of (time, length, total creation time) with one entry per instant
+    at which it changed, so queue statistics don't need polling processes.
+    Like the log, the maximum only looks at the length at the end of each
+    instant, so an item that is handed straight to a waiting getter is
+    never counted as queued.
+    """
+
+    def __init__(self, env, *args, **kwargs):
+        super().__init__(env, *args, **kwargs)
+        self.t_total = 0.0
+        self.t_squares = 0.0
+        self.t_start = env.now
+        self.area = 0.0
+        self.max_closed = 0
+        self.log_time = array("d", [env.now])
+        self.log_length = array("l", [0])
+        self.log_total = array("d", [0.0])
+        self.limit = None
+        self.overflow = None
+
+    def mean_age(self, now):
+        """Mean age of items in the store."""
+        n = len(self.items)
+        return 0 if n == 0 else now - self.t_total / n
+
+    def var_age(self, now):
+        """Variance of the ages of items in the store."""
+        n = len(self.items)
+        if n == 0:
+            return 0
+        mean = self.t_total / n
+        return max(0.0, self.t_squares / n - mean * mean)
+
+    @property
+    def max_length(self):
+        """Largest length at the end of any instant so far."""
+        return max(self.max_closed, self.log_length[-1])
+
+    def mean_length(self, now):
+        """Time-weighted mean length of the store up to `now`."""
+        if now <= self.t_start:
+            return 0
+        area = self.area + self.log_length[-1] * (now - self.log_time[-1])
+        return area / (now - self.t_start)
+
+    def watch(self, limit):
+        """Event that succeeds when the store first holds more than `limit` items."""
+        self.limit = limit
+        self.overflow = self._env.event()
+        return self.overflow
+
+    def sample(self, interval, until):
+        """Yield (time, length, mean age) every `interval` before `until`.
+
+        This gives the same values as a process that polled the store, but
+        is computed afterward from the change log.
+        """
+        i = 0
+        k = 0
+        while (now := k * interval) < until:
+            i = bisect_right(self.log_time, now, lo=i) - 1
+            n = self.log_length[i]
+            age = 0 if n == 0 else now - self.log_total[i] / n
+            yield now, n, age
+            k += 1
+
+    def _added(self, item):
+        self.t_total += item.t_create
+        self.t_squares += item.t_create * item.t_create
+        self._changed()
+        if (
+            self.limit is not None
+            and len(self.items) > self.limit
+            and not self.overflow.triggered
+        ):
+            self.overflow.succeed(len(self.items))
+
+    def _removed(self, item):
+        if not self.items:
+            # Start again from exact zeros so rounding errors don't build up.
+            self.t_total = 0.0
+            self.t_squares = 0.0
+        else:
+            self.t_total -= item.t_create
+            self.t_squares -= item.t_create * item.t_create
+        self._changed()
+
+    def _changed(self):
+        now = self._env.now
+        if now == self.log_time[-1]:
+            self.log_length[-1] = len(self.items)
+            self.log_total[-1] = self.t_total
+            return
+        self.area += self.log_length[-1] * (now - self.log_time[-1])
+        self.max_closed = max(self.max_closed, self.log_length[-1])
+        self.log_time.append(now)
+        self.log_length.append(len(self.items))
+        self.log_total.append(self.t_total)
+
+    def _do_put(self, event):
+        result = super()._do_put(event)
+        if event.triggered:
+            self._added(event.item)
+        return result
+
+    def _do_get(self, event):
+        result = super()._do_get(event)
+        if event.triggered:
+            self._removed(event.value)
+        return result
+
+
+# Marks entries in a heap for items that have been removed or re-keyed.
+_DEAD = object()
+
+
+class Heap:
+    """Heap of items ordered by key that can find any item it holds.
+
+    Entries are [key, sequence number, item] lists, so ordering them
+    compares keys in C and ties are first-in, first-out. Each item's entry
+    is its handle: changing an item's key or removing it marks the entry
+    as dead in constant time instead of searching for and re-sorting it,
+    and dead entries are discarded when they reach the top of the heap or
+    make up more than half of it. Items are found by identity, so they
+    don't need to be hashable. An item can be pushed more than once, and
+    `remove` and `update` then act on its oldest entry.
+    """
+
+    def __init__(self):
+        self.entries = []
+        self.handles = {}
+        self.size = 0
+        self.sequence = count()
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, item):
+        return id(item) in self.handles
+
+    def push(self, key, item):
+        """Add `item` with `key`."""
+        entry = [key, next(self.sequence), item]
+        self.handles.setdefault(id(item), []).append(entry)
+        self.size += 1
+        heappush(self.entries, entry)
+
+    def pop(self):
+        """Remove and return the item with the smallest key."""
+        self.peek()
+        entry = heappop(self.entries)
+        self._forget(entry)
+        return entry[-1]
+
+    def peek(self):
+        """The item with the smallest key, or None if there isn't one."""
+        entries = self.entries
+        while entries and entries[0][-1] is _DEAD:
+            heappop(entries)
+        return entries[0][-1] if entries else None
+
+    def remove(self, item):
+        """Take `item` out of the heap."""
+        entry = self.handles[id(item)][0]
+        self._forget(entry)
+        entry[-1] = _DEAD
+        if len(self.entries) > 2 * self.size + 1:
+            self.entries = [e for e in self.entries if e[-1] is not _DEAD]
+            heapify(self.entries)
+
+    def update(self, key, item):
+        """Give `item` a new key, after any items that already have that key."""
+        self.remove(item)
+        self.push(key, item)
+
+    def _forget(self, entry):
+        """Drop the handle of an entry that is leaving the heap."""
+        key = id(entry[-1])
+        handles = self.handles[key]
+        if len(handles) == 1:
+            del self.handles[key]
+        else:
+            handles.pop(next(i for i, h in enumerate(handles) if h is entry))
+        self.size -= 1
+
+
+class Ranked:
+    """Store that hands out items in the order given by a policy.
+
+    `policy` is the name of a key function in `POLICIES` or the function
+    itself. An item's key is found once when it is put in and kept in a
+    `Heap`, so keeping the store in order never calls Python comparison
+    methods. Items already in the store can be looked at, removed, or
+    re-ranked after a change such as a new priority in O(log n) time.
+    """
+
+    def __init__(self, env, *args, policy="priority", **kwargs):
+        super().__init__(env, *args, **kwargs)
+        self.key = sort_key(policy) if isinstance(policy, str) else policy
+        self.items = Heap()
+
+    def peek(self):
+        """The next item a get would receive, or None if the store is empty."""
+        return self.items.peek()
+
+    def remove(self, item):
+        """Take `item` out of the store, e.g., to cancel it."""
+        self.items.remove(item)
+        self._removed(item)
+        self._trigger_put(None)
+
+    def update_priority(self, item):
+        """Re-rank `item` after something its key depends on has changed."""
+        self.items.update(self.key(item), item)
+
+    def _do_put(self, event):
+        if len(self.items) < self._capacity:
+            self.items.push(self.key(event.item), event.item)
+            event.succeed()
+
+    def _do_get(self, event):
+        if self.items:
+            event.succeed(self.items.pop())
+
+    def _removed(self, item):
+        pass
+
+
+class Source:
+    """Store that can be one of the sources of a `get_any`.
+
+    A pending `get_any` waits in the get queues of all its sources and is
+    served by whichever has an item first. The others drop it the next
+    time they look at their queues instead of searching for it.
+    """
+
+    def _do_get(self, event):
+        if event.triggered:
+            return True
+        result = super()._do_get(event)
+        if event.triggered and isinstance(event, AnyGet):
+            event.source = self
+        return result
+
+
+class AnyGet(Event):
+    """Get one item from the first of several stores that has one.
+
+    Stores are tried in the order given, so earlier ones take priority
+    when several have items. Only one item is ever taken, and `source` is
+    the store it came from.
+    """
+
+    def __init__(self, stores):
+        super().__init__(stores[0]._env)
+        self.stores = stores
+        self.source = None
+        self.callbacks.append(self._served)
+        for store in stores:
+            store.get_queue.append(self)
+            store._trigger_get(None)
+            if self.triggered:
+                break
+
+    def cancel(self):
+        """Stop waiting, e.g., if the getter was interrupted."""
+        if not self.triggered:
+            for store in self.stores:
+                store.get_queue.remove(self)
+
+    def _served(self, event):
+        # Drop served gets from the front of each queue so that queues which
+        # are seldom put to (like a worker's own queue) don't fill up.
+        for store in self.stores:
+            queue = store.get_queue
+            while queue and queue[0].triggered:
+                queue.pop(0)
+        self.source._trigger_put(event)
+
+
+def get_any(*stores):
+    """Event for the first item available from `stores` in order of priority."""
+    return AnyGet(stores)
+
+
+class SourceStore(Source, Store):
+    """First-in, first-out store that can be used with `get_any`."""
+
+
+class SourcePriorityStore(Source, Ranked, Store):
+    """Priority store that can be used with `get_any`."""
+
+
+class TallyStore(Source, Tally, Store):
+    """First-in, first-out store with running statistics."""
+
+
+class TallyPriorityStore(Source, Tally, Ranked, Store):
+    """Priority store with running statistics."""
+
+
+def downsample(queue, interval, until, **labels):
+    """Lists of "lengths" and "ages" rows sampled from a tally store.
+
+    Extra keyword arguments such as `name` are added to every row. An
+    interval of zero or None turns sampling off.
+    """
+    lengths, ages = [], []
+    if not interval:
+        return lengths, ages
+    for now, length, mean_age in queue.sample(interval, until):
+        lengths.append({"time": now, **labels, "length": length})
+        ages.append({"time": now, **labels, "mean_age": mean_age})
+    return lengths, ages
+
+
+def queue_stats(queue, now, **labels):
+    """One "queues" row of exact statistics for a tally store."""
+    return {
+        **labels,
+        "mean_length": queue.mean_length(now),
+        "max_length": queue.max_length,
+    }
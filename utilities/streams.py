@@ -0,0 +1,96 @@
+"""Block-prefetched random number streams."""
+
+import hashlib
+import math
+from itertools import chain
+
+import numpy as np
+
+BLOCK = 4096
+
+
+class Streams:
+    """Named random streams for one simulation.
+
+    `streams["job_arrival"]` is the stream for one purpose, which has the
+    same sampling methods as `random.Random`. Each stream is seeded from
+    the base seed and its name, so the values it gives don't depend on
+    what other streams are used or in what order. Giving every purpose its
+    own stream means that scenarios with the same seed see the same jobs
+    even if they use them differently (common random numbers). If
+    `antithetic` is true, every uniform u that values are made from is
+    replaced by 1 - u, so the pair of runs with and without it have
+    negatively correlated results (antithetic variates).
+    """
+
+    def __init__(self, seed, antithetic=False):
+        self.seed = seed
+        self.antithetic = antithetic
+        self._streams = {}
+
+    def __getitem__(self, name):
+        try:
+            return self._streams[name]
+        except KeyError:
+            stream = Stream(self.generator(name), self.antithetic)
+            self._streams[name] = stream
+            return stream
+
+    def generator(self, name):
+        """NumPy generator for the stream called `name`."""
+        digest = hashlib.sha256(name.encode()).digest()
+        spawn_key = (int.from_bytes(digest[:8]),)
+        return np.random.default_rng(
+            np.random.SeedSequence(self.seed, spawn_key=spawn_key)
+        )
+
+
+class Stream:
+    """One stream of random values drawn from NumPy in blocks.
+
+    Values are made by transforming standard variates, so streams with the
+    same seed stay in step even when distribution parameters differ.
+    """
+
+    def __init__(self, generator, antithetic=False):
+        flip = _FLIPS if antithetic else {}
+        self._exponential = sample(
+            generator.standard_exponential, flip=flip.get("exponential")
+        )
+        self._normal = sample(generator.standard_normal, flip=flip.get("normal"))
+        self._uniform = sample(generator.random, flip=flip.get("uniform"))
+
+    def expovariate(self, lambd):
+        return next(self._exponential) / lambd
+
+    def lognormvariate(self, mu, sigma):
+        return math.exp(mu + sigma * next(self._normal))
+
+    def uniform(self, a, b):
+        return a + (b - a) * next(self._uniform)
+
+    def choice(self, seq):
+        return seq[min(int(next(self._uniform) * len(seq)), len(seq) - 1)]
+
+
+def sample(draw, block=BLOCK, flip=None, **kwargs):
+    """Iterator over values from `draw(size=block, **kwargs)`, refilled as needed.
+
+    If `flip` is given it is applied to each block before use.
+    """
+
+    def refill():
+        values = draw(size=block, **kwargs)
+        return (values if flip is None else flip(values)).tolist()
+
+    return chain.from_iterable(iter(refill, None))
+
+
+# Antithetic versions of standard variates: if a variate was made from the
+# uniform u by inverting its CDF, these give the variate made from 1 - u.
+# For an exponential e = -log(1 - u), so 1 - u = exp(-e).
+_FLIPS = {
+    "exponential": lambda e: -np.log(-np.expm1(-e)),
+    "normal": np.negative,
+    "uniform": lambda u: 1.0 - u,
+}
@@ -0,0 +1,100 @@
+"""Per-simulation storage for simulation records."""
+
+import math
+from array import array
+from collections import defaultdict
+from itertools import count
+
+import utilities
+
+NAN = float("nan")
+
+
+class Column:
+    """Attribute stored in a column of its record's table.
+
+    Records using columns need `id` and `table` attributes (usually as
+    `__slots__`), which `Table.add` fills in. Values are floats with None
+    stored as NaN, or one of a fixed set of labels stored as a small code.
+    """
+
+    def __init__(self, *labels):
+        self.labels = labels
+        self.codes = {label: i for i, label in enumerate(labels)}
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, record, owner=None):
+        if record is None:
+            return self
+        value = record.table.columns[self.name][record.id]
+        if self.labels:
+            return self.labels[value]
+        return None if math.isnan(value) else value
+
+    def __set__(self, record, value):
+        if self.labels:
+            value = self.codes[value]
+        elif value is None:
+            value = NAN
+        record.table.columns[self.name][record.id] = value
+
+    def empty(self):
+        return array("b") if self.labels else array("d")
+
+    def export(self, values):
+        if self.labels:
+            return [self.labels[v] for v in values]
+        digits = utilities.PRECISION
+        return [None if math.isnan(v) else round(v, digits) for v in values]
+
+
+class Table:
+    """Columns for every `Column` attribute of a record class."""
+
+    def __init__(self, record_cls):
+        self.fields = {}
+        for cls in reversed(record_cls.__mro__):
+            for name, attr in vars(cls).items():
+                if isinstance(attr, Column):
+                    self.fields[name] = attr
+        self.columns = {name: field.empty() for name, field in self.fields.items()}
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    def add(self, record):
+        """Give a record the next row of the table."""
+        record.id = self.length
+        record.table = self
+        self.length += 1
+        for name, column in self.columns.items():
+            column.append(0 if self.fields[name].labels else NAN)
+
+    def export(self, names):
+        """Selected columns as lists, rounded like `rnd`."""
+        return {name: self.fields[name].export(self.columns[name]) for name in names}
+
+
+class Registry:
+    """Ids and instances of recorded objects, owned by one simulation.
+
+    Keeping these on the simulation rather than on a class means several
+    simulations can run at once in the same process.
+    """
+
+    def __init__(self):
+        self._next_id = defaultdict(count)
+        self._all = defaultdict(list)
+
+    def __getitem__(self, cls):
+        return self._all[cls]
+
+    def add(self, obj):
+        """Record an object and return its id among objects of its class."""
+        cls = obj.__class__
+        self._all[cls].append(obj)
+        return next(self._next_id[cls])
@@ -0,0 +1,92 @@
+"""Warm-up detection and truncation with MSER-5."""
+
+import numpy as np
+import polars as pl
+
+BATCH = 5
+
+
+def mser(values, batch=BATCH):
+    """Number of leading values to drop as warm-up (MSER with batches of `batch`).
+
+    Values are averaged in batches. The truncation point is the number of
+    batches d, no more than half of them, that minimizes the variance of
+    the mean of the remaining batches, sum((y - mean)^2) / (n - d)^2. It
+    is given as a number of values rather than batches.
+    """
+    n = len(values) // batch
+    if n < 2:
+        return 0
+    y = np.asarray(values[: n * batch], dtype=float).reshape(n, batch).mean(axis=1)
+    # Sums over y[d:] for every d at once.
+    total = np.cumsum(y[::-1])[::-1]
+    squares = np.cumsum((y * y)[::-1])[::-1]
+    kept = np.arange(n, 0, -1)
+    stat = (squares - total * total / kept) / (kept * kept)
+    return int(np.argmin(stat[: n // 2 + 1])) * batch
+
+
+def df_warmup(df, col_time, col_value, group_col="iter", batch=BATCH):
+    """Warm-up time and steady-state mean of `col_value` for each group.
+
+    Rows are put in order of `col_time` within each group and MSER is
+    applied to their values. `t_warmup` is the time of the first row kept;
+    the mean and count of `col_value` only use rows from then on. If MSER
+    drops as many rows as it may (half of them) the group never settled,
+    so `at_limit` is true and the mean is null rather than a steady-state
+    estimate.
+    """
+    rows = []
+    for part in df.sort(col_time).partition_by(group_col, maintain_order=True):
+        part = part.drop_nulls(col_value)
+        if part.is_empty():
+            continue
+        drop = mser(part[col_value].to_numpy(), batch)
+        at_limit = drop >= len(part) // batch // 2 * batch
+        steady = part[drop:]
+        rows.append(
+            {
+                group_col: part[group_col][0],
+                "t_warmup": steady[col_time][0],
+                col_value: None if at_limit else steady[col_value].mean(),
+                "n_steady": len(steady),
+                "at_limit": at_limit,
+            }
+        )
+    schema = {
+        group_col: df.schema[group_col],
+        "t_warmup": df.schema[col_time],
+        col_value: pl.Float64,
+        "n_steady": pl.Int64,
+        "at_limit": pl.Boolean,
+    }
+    return pl.DataFrame(rows, schema=schema).sort(group_col)
+
+
+def df_truncate(df, warmup, col_time, group_col="iter"):
+    """Rows of `df` at or after their group's warm-up time from `df_warmup`."""
+    return (
+        df.join(warmup.select(group_col, "t_warmup"), on=group_col)
+        .filter(pl.col(col_time) >= pl.col("t_warmup"))
+        .drop("t_warmup")
+    )
+
+
+def df_steady_throughput(jobs, warmup, group_col="iter"):
+    """Throughput counting only jobs completed after the warm-up time.
+
+    Throughput is null for groups whose warm-up reached MSER's limit.
+    """
+    throughput = pl.col("num_jobs") / pl.col("t_steady")
+    return (
+        jobs.join(warmup.select(group_col, "t_warmup", "at_limit"), on=group_col)
+        .group_by(group_col)
+        .agg(
+            pl.col("t_warmup").first(),
+            pl.col("at_limit").first(),
+            (pl.col("t_complete") >= pl.col("t_warmup")).sum().alias("num_jobs"),
+            (pl.col("t_sim").first() - pl.col("t_warmup").first()).alias("t_steady"),
+        )
+        .with_columns(pl.when(~pl.col("at_limit")).then(throughput).alias("throughput"))
+        .sort(group_col)
+    )